@@ -2,12 +2,10 @@ from __future__ import annotations
 import asyncio
 from collections import deque
 import datetime
+import math
 import os
 from typing import Optional
-import pyautogui
 import cv2 as cv
-import numpy as np
-import easyocr
 import threading
 import time
 import curses
@@ -17,8 +15,19 @@ from timers.Dota2_Timer import Dota2_Timer
 from timers.Rune_Timer import Rune_Timer
 from timers.Tormentor_Timer import TormentorTimer
 from timers.Roshan_Timer import RoshanTimer
-from utils.screen_areas import area_time
-from utils.terminal import TerminalWindow, SelfGrowingWindowGrid
+from utils.calibration import hud
+from utils.template_bank import template_bank
+from utils.capture import Frame, create_backend
+from utils.change_detector import region_changes
+from utils.clock_reader import ClockReader, parse_game_time, read_clock
+from utils.ocr import ocr, ocr_service
+from utils.game_clock import GameClock
+from utils.workers import match_pool
+from utils.scheduler import scheduler
+from utils.interval_controller import interval_controller
+from utils.presence import PROBE_INTERVAL, presence
+from utils.pipeline import Pipeline
+from utils.terminal import Header, TerminalWindow, SelfGrowingWindowGrid, pacer
 from utils.history import TimestampedHistory
 from utils.constants import GRID_X, GRID_Y
 import pickle
@@ -26,16 +35,19 @@ import pickle
 from utils.settings import settings
 
 global_game_timedelta = datetime.timedelta(hours=0, minutes=0, seconds=0)
+game_clock = GameClock()
 
 
+def current_game_time() -> datetime.timedelta:
+    """Game time right now for the UI, extrapolated between clock reads."""
+    return game_clock.now() or global_game_timedelta
 
-async def process_timer(timer: Optional[Dota2_Timer], s: cv.typing.MatLike, global_game_timedelta: datetime.timedelta, history: TimestampedHistory):
-    output = {}
-    if not timer or timer.disabled:
-        return output
-    
+
+
+def drop_future_timers(timer: Dota2_Timer, global_game_timedelta: datetime.timedelta) -> bool:
+    """Remove timers that were started after the current game time (scrolled back in a replay), True if there were any."""
+    skipped = False
     if global_game_timedelta.total_seconds() > 90:
-        skipped = False
         for started_time, delayTimer in timer.timers.copy().items():
             # check if timer was started in the future
             if started_time > global_game_timedelta:
@@ -47,32 +59,62 @@ async def process_timer(timer: Optional[Dota2_Timer], s: cv.typing.MatLike, glob
                     timer.timers.pop(started_time)
                     timer.started -= 1 if timer.started > 0 else 0
                 skipped = True
-        if skipped:
-            return output
+    return skipped
+
+
+def timer_detected(timer: Dota2_Timer, output: dict, global_game_timedelta: datetime.timedelta, history: TimestampedHistory):
+    """Start the timer for a detection and put it in the history."""
+    started = timer.start_timer_timedelta(
+        output,
+        (
+            global_game_timedelta
+            if not settings.use_real_time
+            else datetime.timedelta(seconds=time.time())
+        ),
+    )
+    if started and timer.history:
+        expiration_time_ingame = (global_game_timedelta + datetime.timedelta(seconds=timer.duration()))
+        timeouts = [expiration_time_ingame]
+        if "Roshan" in timer.name:
+            # Roshan has a 3 minute window to respawn
+            window_end = expiration_time_ingame + datetime.timedelta(minutes=3)
+            timeouts.append(window_end)
+        history.add_event(
+            timer.name,
+            global_game_timedelta,
+            timeouts
+        )
+
+
+async def process_timer(timer: Optional[Dota2_Timer], s: Frame, global_game_timedelta: datetime.timedelta, history: TimestampedHistory, detect: bool = True):
+    output = {}
+    if not timer or timer.disabled:
+        return output
+    if drop_future_timers(timer, global_game_timedelta):
+        return output
     
-    if timer.started < timer.max_instances:
+    # the region might not have been captured if the timer state changed since the screenshot
+    if detect and timer.started < timer.max_instances and s.contains(timer.search_region):
         found, output = await timer.detect_image(s)
+        hud.template_result(timer.area, found)
         if found:
-            started = timer.start_timer_timedelta(
-                output,
-                (
-                    global_game_timedelta
-                    if not settings.use_real_time
-                    else datetime.timedelta(seconds=time.time())
-                ),
-            )
-            if started and timer.history:
-                expiration_time_ingame = (global_game_timedelta + datetime.timedelta(seconds=timer.duration()))
-                timeouts = [expiration_time_ingame]
-                if "Roshan" in timer.name:
-                    # Roshan has a 3 minute window to respawn
-                    window_end = expiration_time_ingame + datetime.timedelta(minutes=3)
-                    timeouts.append(window_end)
-                history.add_event(
-                    timer.name,
-                    global_game_timedelta,
-                    timeouts
-                )
+            timer_detected(timer, output, global_game_timedelta, history)
+    return output
+
+
+def apply_detection(timer: Optional[Dota2_Timer], detection: Optional[tuple], global_game_timedelta: datetime.timedelta, history: TimestampedHistory):
+    """process_timer for a detection that was done somewhere else (pipeline processes): (found, outputs, detected_image_name, searched_area)."""
+    output = {}
+    if not timer or timer.disabled:
+        return output
+    if drop_future_timers(timer, global_game_timedelta):
+        return output
+    if timer.started < timer.max_instances and detection is not None:
+        timer.found, output, detected_image_name, timer.searched_area = detection
+        hud.template_result(timer.area, timer.found)
+        if timer.found:
+            timer.detected_image_name = detected_image_name
+            timer_detected(timer, output, global_game_timedelta, history)
     return output
 
 
@@ -80,142 +122,227 @@ async def process_timer(timer: Optional[Dota2_Timer], s: cv.typing.MatLike, glob
 c = threading.Condition()
 
 
+def should_detect(timer: Optional[Dota2_Timer]) -> bool:
+    return bool(timer) and not timer.disabled and (timer.spawn_at() <= global_game_timedelta or settings.use_real_time)
+
+
+def capture_regions(planned: list[Dota2_Timer]) -> list[tuple[int, int, int, int]]:
+    """The clock (and the hud frame around it) plus the search regions of the timers that run image detection this tick."""
+    return [hud.area_time, presence.ring()] + [timer.search_region for timer in planned]
+
+
+def gate_time() -> datetime.timedelta:
+    """The clock the timers run on, what rearm_at() is compared against."""
+    return datetime.timedelta(seconds=time.time()) if settings.use_real_time else global_game_timedelta
+
+
+def schedule_time() -> float:
+    """The clock the detector cadences run on."""
+    return time.time() if settings.use_real_time else current_game_time().total_seconds()
+
+
 class RunImageRecognition(threading.Thread):
     def __init__(self, queue: Queue[list, str, int], *args, **kwargs):
         super(RunImageRecognition, self).__init__(*args, **kwargs)
         self.queue = queue
-        self.reader = easyocr.Reader(["en"])
+        self.reader = ocr
         self.is_main_menu = False
-        self.float = 1.0
-        self.side = 0
-        self.time_interval_history = [0, 0]
         self.flipflop = 0
+        self.last_tune = None  # wall time of the last interval update
+        self.capture = create_backend(settings.capture_backend)
+        self.last_game_time = None  # raw OCR text, reused while the clock region doesn't change
+        self.clock_reader = ClockReader()
+        self.clock_source = ""
+        self.planned = set()  # labels of the timers the scheduler picked for this tick
+        self.probing = None  # scale probe running on a worker
+        self.idle_wall = 0.0  # time spent waiting for the next tick, and the CPU time that took
+        self.idle_cpu = 0.0
         
 
     def run(self):
-        # mutex
-        while True:
-            if not self.queue.empty():
-                asyncio.run(self.run_async())
-                
-    async def run_async(self):
+        # one event loop for the whole thread, sleeps on the queue between ticks
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while (job := self.wait()) is not None:
+            loop.run_until_complete(self.run_async(*job))
+        loop.close()
+
+    def wait(self):
+        """Blocks until the UI thread hands over the next tick, counting what the waiting costs."""
+        wall, cpu = time.time(), time.thread_time()
+        job = self.queue.get()
+        self.idle_wall += time.time() - wall
+        self.idle_cpu += time.thread_time() - cpu
+        return job
+
+    def idle_summary(self) -> str:
+        """CPU used while waiting for ticks since the last summary, should be next to nothing."""
+        share = self.idle_cpu / self.idle_wall * 100 if self.idle_wall else 0.0
+        line = f"Idle: {self.idle_wall:.2f}s waiting, {self.idle_cpu * 1000:.1f}ms CPU ({share:.1f}%)"
+        self.idle_wall = self.idle_cpu = 0.0
+        return line
+
+    async def run_async(self, timers: list[Dota2_Timer], windows: list[TerminalWindow], history: TimestampedHistory):
+        # no game on screen: a look at the hud frame around the clock is all we do
+        if presence.sleeping and not presence.wake(self.capture.grab([presence.ring()])):
+            return
+        if hud.due():
+            self.calibrate(timers)
         beforescreenshot = time.time()
-        s = pyautogui.screenshot()
+        s = self.capture.grab(capture_regions(self.plan(timers)))
         afterscreenshot = time.time()
+        presence.probe(s)
+        # the inventory is cheap to probe and the bottle is there most of the time
+        self.probe_scale(s, [timer for timer in timers if timer and timer.area == "area_items"])
+        self.apply_scale(timers)
         # TODO: stack warning at 50s
         
-        s = cv.cvtColor(np.array(s), cv.COLOR_RGB2BGR)
-        timers, windows, history = self.queue.get()
-        
         conf_win, timer_win, history_win = windows
         
         
         conf_win.startWrite()
-        # blink a square, use either solid line block or nothing in terms of ascii
-        if self.flipflop:
-            conf_win.write("▓")
-            self.flipflop = 0
-        else:
-            conf_win.write(" ")
-            self.flipflop = 1
-            
-        
-        conf_win.write("Screenshot taken in {:.2f}s".format(afterscreenshot - beforescreenshot))
+        self.blink(conf_win)
+        conf_win.write("Screenshot taken in {:.2f}s ({}, {} px)".format(afterscreenshot - beforescreenshot, self.capture.name, s.area()))
         jobs = [self.detect_game_time(s, timers, conf_win, history)]
         if not self.is_main_menu:
             jobs.append(self.run_image_detection(s, timers, windows, history))
         await asyncio.gather(*jobs)
         total = time.time() - beforescreenshot
         conf_win.write(f"Total: {total:.2f}s")
+        for line in region_changes.summary():
+            conf_win.write(line)
+        conf_win.write(hud.summary())
+        conf_win.write(ocr_service.summary())
+        conf_win.write(self.reader.summary())
+        for line in match_pool.summary():
+            conf_win.write(line)
+        conf_win.write(presence.summary())
+        conf_win.write(self.idle_summary())
+        conf_win.write(timer_win.summary())
+        conf_win.write(pacer.summary())
         conf_win.finishWrite()
+        pacer.mark()  # timers may have started
+
+    def plan(self, timers: list[Dota2_Timer]) -> list[Dota2_Timer]:
+        """Timers to run this tick: armed by the game state, due by their own cadence and within the tick budget."""
+        now = gate_time()
+        armed = [timer for timer in timers if should_detect(timer) and timer.armed(now)]
+        planned = [] if self.is_main_menu else scheduler.plan(armed, schedule_time())
+        for timer in planned:
+            timer.active_images = timer.candidate_images()
+        self.planned = {timer.label for timer in planned}
+        return planned
+
+    def suspended(self, timers: list[Dota2_Timer]) -> list[str]:
+        """Why the timers that can't fire right now are not searched."""
+        lines, now = [], gate_time()
+        for timer in timers:
+            if not timer or timer.disabled or timer.armed(now):
+                continue
+            rearm = timer.rearm_at()
+            until = f"until {str(rearm).split('.')[0]}" if rearm is not None else "until something else happens"
+            lines.append(f"{timer.name}: suspended {until}")
+        return lines
+
+    def probe_scale(self, frame: Frame, timers: list[Dota2_Timer]):
+        """
+        Look for the template scale (cached per resolution) on a worker, detection goes on at the current scale
+        meanwhile. apply_scale() switches the templates once it's found."""
+        if self.probing is not None or settings.template_scale or not hud.probe_due():
+            return
+        native = template_bank.native()
+        targets = [(timer.search_region, {image: native.get(image) for image in timer.images}) for timer in timers if timer and timer.area]
+        self.probing = match_pool.background(hud.probe_scale, frame, targets)
+
+    def apply_scale(self, timers: list[Dota2_Timer]):
+        """The templates follow hud.scale: probed, or back to the resolution's after a probed scale was dropped."""
+        if self.probing is not None and self.probing.done():
+            self.probing = None
+        if settings.template_scale or hud.scale == template_bank.scale:
+            return
+        template_bank.rescale(hud.scale)
+        for timer in timers:
+            if timer:
+                timer.reload_templates()
+
+    def calibrate(self, timers: list[Dota2_Timer]):
+        """Look for the hud on a full screen grab, the timers follow the new regions."""
+        frame = self.capture.grab([(0, 0, *self.capture.screen)])
+        self.probe_scale(frame, [timer for timer in timers if timer and timer.area == "area_items"])
+        items = {image: template for timer in timers if timer and timer.area == "area_items" for image, template in timer.image_files.items()}
+        if hud.calibrate(frame, items, lambda crop: parse_game_time(self.read_clock(crop) or "") is not None):
+            for timer in timers:
+                if timer and timer.area:
+                    timer.use_area(timer.area)
+            self.last_game_time = None
+
+    def blink(self, conf_win: TerminalWindow):
+        # blink a square, use either solid line block or nothing in terms of ascii
+        if self.flipflop:
+            conf_win.write("▓")
+            self.flipflop = 0
+        else:
+            conf_win.write(" ")
+            self.flipflop = 1
+
+    async def clock_text(self, frame: Frame) -> str:
+        """Raw clock text of this frame, reused while the clock region doesn't change."""
+        screenshot = frame.crop(*hud.area_time)
+        if region_changes.changed("Clock", screenshot) or self.last_game_time is None:
+            self.last_game_time = await match_pool.run(self.read_clock, screenshot) or "0:00"
+        return self.last_game_time
+
+    async def process_timer(self, timer: Optional[Dota2_Timer], s, history: TimestampedHistory):
+        return await process_timer(timer, s, global_game_timedelta, history, timer is not None and timer.label in self.planned)
 
-    async def detect_game_time(self, screenshot: cv.typing.MatLike, timers: list[Dota2_Timer], conf_win: TerminalWindow, history: TimestampedHistory):
+    async def detect_game_time(self, screenshot: Frame, timers: list[Dota2_Timer], conf_win: TerminalWindow, history: TimestampedHistory):
         before = time.time()        
         global global_game_timedelta
         game_time = "0:00"
 
-        # get the game time
-        screenshot = screenshot[
-            area_time[1] : area_time[1] + area_time[3],
-            area_time[0] : area_time[0] + area_time[2],
-        ]
-        result = self.reader.readtext(screenshot, detail=0)
-        if len(result) > 0:
-            result = result[0]
-            game_time = result.replace(".", ":")
-        self.is_main_menu = "LEAR" in game_time or "0:00" in game_time
-        conf_win.write(f"Game Time (before parsing): {'No game visible, skipping detection...' if self.is_main_menu else game_time}")
-        if self.is_main_menu:
-            settings.image_detection_interval = min(0.2 + settings.image_detection_interval, 10.0)
-            return {}
-        # parse dota 2 timer (5:36:30 h:m:s or 6:30 h:m)
-        actual_time = game_time.split(":")
-        # check if length is 3 and all parts are numbers
-        if all([part.isdigit() for part in actual_time]) and len(actual_time) > 1 and len(actual_time) < 4:
-            if len(actual_time) == 3:
-                actual_time = datetime.timedelta(
-                    hours=int(actual_time[0]),
-                    minutes=int(actual_time[1]),
-                    seconds=int(actual_time[2]),
-                )
-            elif len(actual_time) == 2:
-                actual_time = datetime.timedelta(
-                    hours=0, minutes=int(actual_time[0]), seconds=int(actual_time[1])
-                )
-        else: 
-            actual_time = None
+        # the clock model is good enough between confirmations, no need to read anything.
+        # Confirm at least every clock_confirm_interval seconds, and every game second (fast replays)
+        now = schedule_time()
+        if (not self.is_main_menu and settings.clock_confirm_interval > 0 and not game_clock.due(settings.clock_confirm_interval)
+                and not scheduler.due("Clock", 1.0, now)):
+            actual_time = datetime.timedelta(seconds=int(game_clock.now().total_seconds()))
+            conf_win.write(f"Game Time (predicted): {actual_time}")
+        else:
+            # get the game time
+            scheduler.mark("Clock", now)
+            game_time = await self.clock_text(screenshot)
+            scheduler.ran("Clock", time.time() - before)
+            # "0:00" is also what we get when nothing was read, but not a substring: 10:00 and 1:00:00 are game times
+            self.is_main_menu = "LEAR" in game_time or game_time.strip() == "0:00"
+            conf_win.write(f"Game Time (before parsing): {'No game visible, skipping detection...' if self.is_main_menu else game_time} ({self.clock_source})")
+            if self.is_main_menu:
+                hud.clock_read(False)
+                self.last_tune = None
+                presence.absent()
+                # a full desktop screenshot per probe would cost more than it saves, pyautogui waits for the next full check
+                settings.image_detection_interval = PROBE_INTERVAL if self.capture.regions else presence.backoff
+                return {}
+            # parse dota 2 timer (5:36:30 h:m:s or 6:30 h:m)
+            actual_time = parse_game_time(game_time)
+            hud.clock_read(actual_time is not None)
+            if actual_time is not None:
+                presence.seen()
+            if actual_time is not None and not game_clock.observe(actual_time):
+                # doesn't fit the clock model, probably a misread. If the next read agrees the model will follow it.
+                conf_win.write(f"Ignoring clock read {actual_time}, expected {game_clock.now()}", 3)
+                actual_time = datetime.timedelta(seconds=int(game_clock.now().total_seconds()))
+        conf_win.write(game_clock.summary())
             
         # Tune the timing of the image detection so that it doesn't run too often or too rarely
         if actual_time:
             elapsed_time = (actual_time - global_game_timedelta).total_seconds()
-            # Convert to 1/n of a second
-            if settings.image_detection_interval < 1 and settings.image_detection_interval > 0:
-                n = 1 / settings.image_detection_interval
-                conf_win.write(f"Approx {n:.1f} times a second")
-            else:
-                n = settings.image_detection_interval
-                conf_win.write(f"Approx {n:.1f} seconds")
-                
             if elapsed_time < 0:
-                # could be at the start of a game, scrolling around the replayF
-                elapsed_time = abs(elapsed_time)
+                # could be at the start of a game, scrolling around the replay
                 if global_game_timedelta.total_seconds() < 90 and not history.new_game: # game starts counting down from 1:30
                     # start a new game
                     timers = [timer.reset() for timer in timers]
                     history.start_new_game()
-                    
-                
-                
-
-            # Tune the image detection interval so that we roughly keep pace with the in-game time
-            if  elapsed_time > 1 and settings.image_detection_interval > 0:
-                # if the difference is more than 2 seconds, try to decrease image detection interval rapidly
-                new_interval = (settings.image_detection_interval - self.float) if settings.image_detection_interval <= 2.0 else 0
-                conf_win.write(f"Decreasing image detection interval to {new_interval:.3f}", 3)
-                
-                if (abs(sum(self.time_interval_history)) == 0 and self.float > 0.001):
-                    self.float = abs(self.float / 2)
-                self.side -= 1
-                self.time_interval_history.append(-1)
-                settings.image_detection_interval = max(0, new_interval)
-            elif elapsed_time < 2 and settings.image_detection_interval < 4:
-                new_interval = settings.image_detection_interval + self.float
-                conf_win.write(f"Increasing image detection interval to {new_interval:.3f}", 2)
-                if (abs(sum(self.time_interval_history)) == 0 and self.float > 0.001):
-                    self.float = abs(self.float / 2)
-                # if the difference is less than 1 second, try to increase image detection interval
-                settings.image_detection_interval = min(4.0, new_interval)
-                self.side += 1
-                self.time_interval_history.append(1)
-                
-            # limit history to 2 elements
-            if (len(self.time_interval_history) > 2):
-                self.time_interval_history.pop(0)
-            if abs(self.side) == 3:
-                self.float = min(self.float * 10, 0.5) # move up a decimal place
-                conf_win.write("Resetting image detection interval", 1)
-                self.side = 0
-            
+            self.tune_interval(conf_win)
             
         global_game_timedelta = actual_time if actual_time else global_game_timedelta
         conf_win.write(f"Game Time (after parsing): {global_game_timedelta}")
@@ -226,6 +353,19 @@ class RunImageRecognition(threading.Thread):
         return {}
 
 
+    def tune_interval(self, conf_win: TerminalWindow):
+        """Space the ticks so each one sees about the same amount of game time, whatever the replay speed."""
+        wall = time.time()
+        if self.last_tune is not None:
+            # game seconds since the last tick, by the speed of the clock model (reads are whole seconds, too coarse for this)
+            settings.image_detection_interval = interval_controller.update(game_clock.rate * (wall - self.last_tune), wall)
+        self.last_tune = wall
+        conf_win.write(interval_controller.summary())
+
+    def read_clock(self, screenshot: cv.typing.MatLike) -> Optional[str]:
+        game_time, self.clock_source = read_clock(screenshot, self.clock_reader if settings.clock_reader else None, self.reader)
+        return game_time
+
     async def run_image_detection(self, s, timers: list[Dota2_Timer], windows: list[TerminalWindow], history: TimestampedHistory):
         beforeImageDetection = time.time()
         global global_game_timedelta
@@ -239,20 +379,33 @@ class RunImageRecognition(threading.Thread):
             history.start_new_game()
 
         # detect images for timer triggers
-        tasks = [process_timer(timer, s, global_game_timedelta, history)
-                 for timer in timers 
-                    if 
-                        timer and 
-                        not timer.disabled
-                        # and timer.started < timer.max_instances # moved, now done inside process_timer
-                        and (timer.spawn_at() <= global_game_timedelta or settings.use_real_time)
+        detecting = [timer for timer in timers if should_detect(timer)]
+        tasks = [self.process_timer(timer, s, history)
+                 for timer in detecting
+                    # and timer.started < timer.max_instances # moved, now done inside process_timer
                 ]
         
         outputs = await asyncio.gather(*tasks)
+        for timer, output in zip(detecting, outputs):
+            # a repeated detection took no time, it would drag the cost estimate to 0 on a static screen
+            if output and not timer.reused:
+                scheduler.ran(timer.label, sum(seconds for _, seconds in output.values()))
+        # templates the early exit never got to
+        skipped = sum(len(timer.images) - len(output) for timer, output in zip(detecting, outputs) if output)
+        searched = sum(len(timer.images) for timer, output in zip(detecting, outputs) if output)
+        searched_area = sum(timer.searched_area for timer, output in zip(detecting, outputs) if output)
+        region_area = sum(timer.search_region[2] * timer.search_region[3] for timer, output in zip(detecting, outputs) if output)
         outputs = {k: v for output in outputs for k, v in output.items()}
         
         afterImageDetection = time.time()
         conf_win.write(f"Image detection: {afterImageDetection - beforeImageDetection:.2f}s")
+        if searched:
+            conf_win.write(f"Early exit skipped {skipped} of {searched} templates" if skipped else f"Full scan of {searched} templates")
+            conf_win.write(f"Searched {searched_area} of {region_area} px")
+        for line in scheduler.summary(schedule_time()):
+            conf_win.write(line)
+        for line in self.suspended(timers):
+            conf_win.write(line)
         conf_win.writeLine("-")
         longest_image = max([len(image) for image in outputs]) if len(outputs) > 0 else 0
         for image, (confidence, time_taken) in outputs.items():
@@ -265,16 +418,88 @@ class RunImageRecognition(threading.Thread):
 
 
 
+class PipelineRecognition(RunImageRecognition):
+    """
+    Same bookkeeping as RunImageRecognition, but capture, clock reading and matching happen in the
+    pipeline processes (--pipeline). This thread only asks for frames, results are applied on another one as they come in."""
+
+    def __init__(self, queue: Queue[list, str, int], timers: list[Dota2_Timer], *args, **kwargs):
+        super(PipelineRecognition, self).__init__(queue, *args, **kwargs)
+        self.timers = timers
+        self.pipeline = None
+        self.latest = None  # (timers, windows, history) of the last tick
+        self.error = None  # why the pipeline stopped, if it did
+
+    def run(self):
+        # the regions are fixed once the pipeline runs, so this is the one chance to calibrate
+        if hud.due():
+            self.calibrate(self.timers)
+        if self.probing is not None:
+            # the matching process loads its templates at the scale of the cache file, so wait for the probe here
+            self.probing.exception()
+            self.apply_scale(self.timers)
+        self.pipeline = Pipeline(self.timers, settings.capture_backend)
+        self.pipeline.start()
+        threading.Thread(target=self.apply_results, daemon=True).start()
+        while (job := self.wait()) is not None and self.error is None:
+            self.latest = job
+            if presence.sleeping and not presence.wake(self.capture.grab([presence.ring()])):
+                continue
+            self.pipeline.request({timer.label: timer.active_images for timer in self.plan(self.latest[0])})
+
+    def apply_results(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while (result := self.pipeline.result()) is not None:
+                loop.run_until_complete(self.apply(result, *self.latest))
+        except RuntimeError as error:
+            # nothing will come through anymore, say so instead of waiting forever
+            self.error = str(error)
+            if self.latest:
+                conf_win = self.latest[1][0]
+                conf_win.startWrite()
+                conf_win.write(f"{self.error}, detection stopped", 3)
+                conf_win.finishWrite()
+                pacer.mark()
+        loop.close()
+
+    async def apply(self, result: dict, timers: list[Dota2_Timer], windows: list[TerminalWindow], history: TimestampedHistory):
+        conf_win, timer_win, history_win = windows
+        conf_win.startWrite()
+        self.blink(conf_win)
+        conf_win.write(f"Frame {result['seq']} taken in {result['capture']:.2f}s ({self.pipeline.backend}, {result['area']} px), {time.time() - result['wall']:.2f}s ago")
+        conf_win.write(f"Clock read in {result['ocr']:.2f}s, matching {result['match']:.2f}s")
+        await self.detect_game_time(result, timers, conf_win, history)
+        if not self.is_main_menu:
+            await self.run_image_detection(result["detections"], timers, windows, history)
+        conf_win.write(self.pipeline.summary())
+        conf_win.write(hud.summary())
+        conf_win.write(presence.summary())
+        conf_win.write(self.idle_summary())
+        conf_win.write(pacer.summary())
+        conf_win.finishWrite()
+        pacer.mark()
+
+    async def clock_text(self, result: dict) -> str:
+        self.clock_source = result["clock_source"]
+        return result["clock"] or "0:00"
+
+    async def process_timer(self, timer: Optional[Dota2_Timer], detections: dict, history: TimestampedHistory):
+        return apply_detection(timer, detections.get(timer.label) if timer else None, global_game_timedelta, history)
+
+    def close(self):
+        if self.pipeline:
+            self.pipeline.close()
+
+
 # TODO:
 # class RuneTimer(Dota2_Timer):
 # a bottle is in one of two states: a rune or a normal bottle
 # when we detect a normal bottle, always cancel the rune timer and start checking for a rune. stop the normal bottle timer
 # when we detect a rune, start a timer, then start checking for normal bottle
-def fstr(template):
-    return eval(f'f"""{template}"""')
-
 def displayTimers(timer_win: TerminalWindow,timers: list[Dota2_Timer]):
-    global global_game_timedelta
+    game_timedelta = current_game_time()
     timer_win.startWrite()
 
     longest_name = max([len(timer.name) for timer in timers])
@@ -291,7 +516,7 @@ def displayTimers(timer_win: TerminalWindow,timers: list[Dota2_Timer]):
                 if not settings.use_real_time:
                     # alternative handling, use timedelta
                     time_remaining = timer.duration() - (
-                        global_game_timedelta.total_seconds()
+                        game_timedelta.total_seconds()
                         - started_time.total_seconds()
                     )
                     if time_remaining > timer.duration():
@@ -357,16 +582,22 @@ def main(stdscr: curses._CursesWindow):
     
     
     timer_win.header = [
-        "q=quit, r=reset, m=mode, i/d=adjust image recognition o/k=adjust UI refresh rate",
+        "q=quit, r=reset, m=mode, i/d=less/more image recognition per game second o/k=adjust UI refresh rate",
         "t=toggle real time, c=toggle confidence window. l=load history",
-        "Using {'real time' if settings.use_real_time else 'game time'}",
-        "{settings.cooldowns.currentMode()}, image recognition every {settings.image_detection_interval} seconds, UI refresh every {settings.refresh_interval_curses}ms",
+        Header(lambda real_time: f"Using {'real time' if real_time else 'game time'}", lambda: settings.use_real_time),
+        Header(
+            lambda mode, interval, target, refresh: f"{mode}, image recognition every {interval:.2f} seconds ({target:g} per game second), UI refresh every {refresh}ms",
+            lambda: settings.cooldowns.currentMode(),
+            lambda: settings.image_detection_interval,
+            lambda: interval_controller.target,
+            lambda: settings.refresh_interval_curses,
+        ),
         "Timers:",
     ]
     
     conf_win = window_grid.addWindow(0, 6)
     conf_win.header = [
-        "Timestamp: {datetime.datetime.now().strftime('%H:%M:%S')}",
+        Header(lambda second: f"Timestamp: {time.strftime('%H:%M:%S', time.localtime(second))}", lambda: int(time.time())),
     ]
     if settings.show_confidence:
         conf_win.disabled = False
@@ -425,26 +656,31 @@ def main(stdscr: curses._CursesWindow):
         timers.append(reset_rune)
     queue = Queue(maxsize=1)
     windows = [conf_win, timer_win, history_win]
-    thread = RunImageRecognition(queue)
+    thread = PipelineRecognition(queue, timers) if settings.pipeline else RunImageRecognition(queue)
     thread.daemon = True # kill the thread when the main thread dies
     thread.start()
     
 
+    second = None  # the clock second on screen
+    resized = False
     while True:
-        history.writeToWindow(global_game_timedelta)
-        # TODO: clear all windows, fix resizing leaving borders inside window
+        # one wait for everything: a key, or until the next detection tick / frame, at most refresh_interval_curses
+        wait = min(settings.refresh_interval_curses / 1000, max(0.0, tick + settings.image_detection_interval - time.time()), pacer.wait())
+        # at least 1ms, timeout(0) doesn't block and the loop would spin until the deadline
+        stdscr.timeout(max(1, math.ceil(wait * 1000)))
         ch = stdscr.getch()
-        if  ch == curses.KEY_RESIZE:
+        key = chr(ch) if 0 <= ch < 256 else ""
+        if ch == curses.KEY_RESIZE:
             lines, cols = stdscr.getmaxyx()
-            print(f"Resizing to {lines}x{cols}")
             curses.resize_term(lines, cols)
-            time.sleep(1) # wait for the terminal to resize, yes it's stupid
             window_grid.resize(lines, cols)
-            continue
-        if ch == curses.KEY_MOUSE:
+            resized = True
+            pacer.mark(input=True)
+        elif ch == curses.KEY_MOUSE:
             id, x, y, z, bstate = curses.getmouse()
             print(f"Mouse event: {id}, {x}, {y}, {z}, {bstate}")
-            
+        elif key:
+            pacer.mark(input=True)
 
         if time.time() - tick > settings.image_detection_interval:
             try:
@@ -453,12 +689,13 @@ def main(stdscr: curses._CursesWindow):
                 pass
             tick = time.time()
 
-        displayTimers(timer_win,timers)
+        now = int(time.time() if settings.use_real_time else current_game_time().total_seconds())
+        if now != second:
+            second = now
+            pacer.mark()
         
         try:
             # TODO: 1,2,3: enable/disable timers
-            # TODO: 
-            key = stdscr.getkey()
             if key == "q":
                 if history:
                     try:
@@ -500,18 +737,32 @@ def main(stdscr: curses._CursesWindow):
                 window_grid.useGridAndGrow()
             if key == "t":
                 settings.use_real_time = not settings.use_real_time
+            # the interval itself follows the game speed (tune_interval), the keys change how often per game second
             if key == "i":
-                settings.image_detection_interval = min(10.0, settings.image_detection_interval + 1)
+                interval_controller.target = max(0.125, interval_controller.target / 2)
             if key == "d":
-                settings.image_detection_interval = max(0.0, settings.image_detection_interval - 1)
+                interval_controller.target = min(10.0, interval_controller.target * 2)
             if key == "o":
                 settings.refresh_interval_curses = min(1000, settings.refresh_interval_curses + 10)
             if key == "k":
                 settings.refresh_interval_curses = max(10, settings.refresh_interval_curses - 10)
         except curses.error:
             pass
-        # curses.napms(1) # will fuck performance of OCR
 
+        # after the keys, so the frame shows what they did
+        if pacer.wait() == 0:
+            generation = pacer.begin()
+            if resized:
+                stdscr.noutrefresh()  # the cleared background, before the windows go on top of it
+                resized = False
+            history.writeToWindow(current_game_time())
+            displayTimers(timer_win,timers)
+            curses.doupdate()  # every window that changed goes out in one write
+            pacer.drawn(generation)
+
+    if settings.pipeline:
+        thread.close()
+    ocr_service.close()
     curses.endwin()
 
 
@@ -0,0 +1,35 @@
+import numpy as np
+import cv2 as cv
+from utils.calibration import HudRegions, find_clock
+from utils.capture import Frame
+from utils.clock_reader import ClockReader
+
+SCREEN = (2560, 1440)
+
+
+def clock_frame(text: str) -> Frame:
+    """A black screen with the clock centered where dota puts it."""
+    image = np.zeros((SCREEN[1], SCREEN[0], 3), np.uint8)
+    # glyph by glyph with a gap (h:mm:ss just fits the default box, like the real clock), hershey digits touch each other otherwise
+    sizes = [cv.getTextSize(glyph, cv.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0] for glyph in text]
+    x = 1276 - (sum(width for width, _ in sizes) + len(text)) // 2
+    for glyph, (width, _) in zip(text, sizes):
+        cv.putText(image, glyph, (x, 48), cv.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        x += width + 1
+    return Frame([((0, 0, *SCREEN), image)], SCREEN)
+
+
+def test_clock_calibrated_at_mss_fits_longer_clocks(tmp_path):
+    hud = HudRegions(str(tmp_path / "hud_regions.json"))
+    hud.defaults(SCREEN)
+    clock = find_clock(clock_frame("4:32"), hud.area_time)
+    assert clock is not None
+    assert clock[2] >= hud.area_time[2] and clock[3] >= hud.area_time[3]
+
+    digits = ClockReader(str(tmp_path / "clock_digits.npz"))
+    # every glyph, learned from crops of the calibrated box (cut off digits don't make it into the bank)
+    for text in ("12:34", "5:06:78", "9:00"):
+        digits.learn(clock_frame(text).crop(*clock), text)
+    assert digits.complete()
+    for text in ("14:32", "1:04:32"):
+        assert digits.read(clock_frame(text).crop(*clock))[0] == text
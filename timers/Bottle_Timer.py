@@ -1,7 +1,5 @@
 from timers.Dota2_Timer import Dota2_Timer
-from utils.settings import settings
-import os
-from utils.screen_areas import area_items
+from utils.template_bank import template_bank
 
 # reset_rune = Dota2_Timer("Bottle")
 # reset_rune.trigger_images(
@@ -23,7 +21,6 @@ from utils.screen_areas import area_items
 class Bottle_Timer(Dota2_Timer):
     def __init__(self, name: str):
         super().__init__(name)
-        self.trigger_images(
-            [os.path.join("images\\bottle\\normal", img) for img in os.listdir("images\\bottle\\normal")]
-        )
-        self.search_area(*area_items)
\ No newline at end of file
+        self.trigger_images(template_bank.images_in("images\\bottle\\normal"))
+        self.use_area("area_items")
+        self.cadence = 0.5  # a rune doesn't stay in the bottle long
\ No newline at end of file
@@ -7,19 +7,44 @@ import cv2 as cv
 import time
 from threading import Timer
 from playsound import playsound
+from utils.calibration import hud
+from utils.capture import Frame
+from utils.change_detector import region_changes
 from utils.cooldown import Mode, Respawn_Duration
+from utils.match_modes import MatchMode
+from utils.template_bank import PYRAMID_LEVELS, template_bank
+from utils.template_matching import TemplatePyramid, TemplateSet
+from utils.workers import match_pool
 from utils.settings import settings
 from utils.terminal import TerminalWindow
 
 
 
+if settings.template_scale:
+    template_bank.rescale(settings.template_scale)
+
+HIT_DECAY = 0.9  # per hit, older hits count less when ordering templates
+PRIOR_PAD = 16  # pixels around the last match location that are searched first
+
+
+def _best_match(screenshot, template):
+    return cv.minMaxLoc(cv.matchTemplate(screenshot, template, cv.TM_CCOEFF_NORMED))
+
+
 class Dota2_Timer:
     def __init__(self, name: str):
         self.name = name
+        self.label = name  # stable name, self.name can be changed by callbacks
         self.images = []
-        self.image_files = {}
+        self.image_files = {}  # BGR templates as loaded
+        self.templates = {}  # templates converted for self.mode, this is what we match with
+        self.template_set = None  # batched matching engine, if it's worth it for this timer
+        self.pyramid_levels = 0
+        self.pyramid = None  # coarse-to-fine matching engine for big search regions
+        self.mode = settings.match_mode_for(name)
         self.duration = lambda: 0
         self.search_region = (0, 0, *pyautogui.size())
+        self.area = None  # name of the hud region we search, see use_area
         self.onFinishedCallback = None
         self.onDetectedCallback = None
         self.started = 0
@@ -33,6 +58,15 @@ class Dota2_Timer:
         self.found = False
         self.color_pair = 0
         self.spawn_at = lambda: datetime.timedelta(seconds=0)
+        self.last_detection = None  # (mode, found, outputs, detected_image_name) of the last processed region
+        self.hits = {}  # image -> decayed number of matches, most frequent templates are tried first
+        self.locations = {}  # image -> (x, y) of its last match in the search region
+        self.since_full_search = 0
+        self.searched_area = 0  # pixels searched by the last detection
+        self.reused = False  # the last detection only repeated the one before it (same pixels), no matching done
+        self.cadence = 1.0  # game seconds between detections, see utils/scheduler.py
+        self.priority = 1
+        self.active_images = None  # templates that can still fire (see candidate_images), None is all of them
     
     def writeProgressBar(self, window: TerminalWindow, time_remaining: float, longest_name: int, scheduledTimer: Timer):
         percentage = 1 - (time_remaining / self.duration())
@@ -53,8 +87,31 @@ class Dota2_Timer:
     def trigger_images(self, images):
         """Set the images to trigger the timer on."""
         self.images = images
-        for image in images: # preload images
-            self.image_files[image] = cv.imread(image, cv.IMREAD_COLOR)
+        for image in images: # preloaded, shared with every other timer through the template bank
+            self.image_files[image] = template_bank.get(image)
+        self.match_mode(self.mode)
+
+    def reload_templates(self):
+        """Templates again from the bank, after it switched scale."""
+        self.image_files = {}
+        self.locations.clear()
+        self.trigger_images(self.images)
+
+    def match_mode(self, mode: MatchMode):
+        """Set which channels to match on, templates are converted once here."""
+        self.mode = mode
+        self.templates = {image: template_bank.get(image, mode) for image in self.images}
+        self.last_detection = None
+        # sharing the ROI's DFT pays off for several color templates, opencv's own loop wins for one or single channel
+        batched = settings.matching == "batched" or (settings.matching == "auto" and mode == MatchMode.COLOR and len(self.templates) > 1)
+        self.template_set = TemplateSet(self.templates) if batched else None
+        small = {image: template_bank.get(image, mode, self.pyramid_levels) for image in self.images} if self.pyramid_levels in PYRAMID_LEVELS else None
+        self.pyramid = TemplatePyramid(self.templates, self.pyramid_levels, small=small) if self.pyramid_levels > 0 else None
+
+    def pyramid_search(self, levels: int):
+        """Search downscaled by 2^levels first, then only around the best candidates at full resolution."""
+        self.pyramid_levels = levels
+        self.match_mode(self.mode)
 
     def timeout(self, timeout):
         """Set the timeout duration function."""
@@ -64,6 +121,15 @@ class Dota2_Timer:
         """Set the search area in the screen."""
         self.search_region = (x, y, width, height)
 
+    def use_area(self, name: str):
+        """Search one of the hud regions (utils/calibration.py), call again to follow a new calibration."""
+        self.area = name
+        region = getattr(hud, name)
+        if region != self.search_region:
+            self.search_area(*region)
+            self.locations.clear()
+            self.last_detection = None
+
     def onFinish(self, callback):
         """Set the action to perform after the timer is done."""
         self.onFinishedCallback = callback
@@ -76,29 +142,136 @@ class Dota2_Timer:
         """Set the audio alert to play when the image is detected."""
         self.sound_file = file
 
-    async def detect_image_task(self, image, screenshot):
-        output = {}
-        start = time.time()
-        template = self.image_files[image]
-        result = cv.matchTemplate(screenshot, template, cv.TM_CCOEFF_NORMED)
-        _, max_conf, _, _ = cv.minMaxLoc(result)
+    def check_match(self, image, screenshot, max_conf, max_loc) -> bool:
+        """Decide if the best match of a template counts, subclasses can look at the matched area."""
         if max_conf >= self.confidence or settings.cooldowns.currentMode() == Mode.DEBUG :  # Confidence threshold
             self.found = True
             self.detected_image_name = image
+            return True
+        return False
+
+    def hit(self, image, location=None):
+        for other in self.hits:
+            self.hits[other] *= HIT_DECAY
+        self.hits[image] = self.hits.get(image, 0.0) + 1.0
+        if location is not None:
+            self.locations[image] = tuple(location)
+
+    def prior_window(self, image, shape):
+        """(x0, y0, x1, y1) around the last match of a template, None if it never matched."""
+        if image not in self.locations:
+            return None
+        x, y = self.locations[image]
+        h, w = self.templates[image].shape[:2]
+        x0, y0 = max(0, x - PRIOR_PAD), max(0, y - PRIOR_PAD)
+        x1, y1 = min(shape[1], x + w + PRIOR_PAD), min(shape[0], y + h + PRIOR_PAD)
+        if x1 - x0 < w or y1 - y0 < h:
+            return None
+        return x0, y0, x1, y1
+
+    async def prior_search(self, screenshot, order):
+        """Search small windows around the last match locations, stops at the first decisive match."""
+        outputs = {}
+        for image in order:
+            window = self.prior_window(image, screenshot.shape)
+            if window is None:
+                continue
+            x0, y0, x1, y1 = window
+            start = time.time()
+            _, max_conf, _, (x, y) = await match_pool.run(_best_match, screenshot[y0:y1, x0:x1], self.templates[image])
+            self.searched_area += (x1 - x0) * (y1 - y0)
+            outputs[image] = (max_conf, time.time() - start)
+            if self.check_match(image, screenshot, max_conf, (x0 + x, y0 + y)):
+                self.hit(image, (x0 + x, y0 + y))
+                break
+        return outputs
+
+    def template_order(self, images: list) -> list:
+        """Templates by recent hit frequency, ties keep the original order."""
+        return sorted(images, key=lambda image: -self.hits.get(image, 0.0))
+
+    def rearm_at(self):
+        """
+        Game time (wall time with use_real_time) from which a detection can start something again,
+        None if only something else can change that (another timer, a reset)."""
+        if self.started < self.max_instances:
+            return datetime.timedelta(0) if settings.use_real_time else self.spawn_at()
+        if self.timers and self.duration() > 0:
+            # the first instance to run out frees a slot
+            return min(self.timers) + datetime.timedelta(seconds=self.duration())
+        return None
+
+    def armed(self, now: datetime.timedelta) -> bool:
+        """Can a detection do anything right now? Suspended timers aren't captured or matched at all."""
+        if self.disabled:
+            return False
+        rearm = self.rearm_at()
+        return rearm is not None and now >= rearm
+
+    def candidate_images(self) -> list:
+        """The templates that can still fire in the current state."""
+        return self.images
+
+    def full_scan(self) -> bool:
+        """Evaluate every template (all confidences for the debug view) instead of stopping at the first decisive match."""
+        return settings.full_scan or settings.cooldowns.currentMode() == Mode.DEBUG
+
+    async def detect_image_task(self, image, screenshot):
+        output = {}
+        start = time.time()
+        template = self.templates[image]
+        _, max_conf, _, max_loc = await match_pool.run(_best_match, screenshot, template)
+        if self.check_match(image, screenshot, max_conf, max_loc):
+            self.hit(image, max_loc)
         output[image] = (max_conf, time.time() - start)
         return output
 
-    async def detect_image(self, screenshot):
+    async def detect_image(self, frame: Frame):
         """Detect an image on the screen within the search area."""
         self.found = False
         outputs = {}
         if self.disabled:
             return self.found, outputs
-        x, y, width, height = self.search_region
-        screenshot = screenshot[y:y+height, x:x+width]
-        tasks = [self.detect_image_task(image, screenshot) for image in self.images]
-        outputs = await asyncio.gather(*tasks)
-        outputs = {k: v for output in outputs for k, v in output.items()}
+        screenshot = frame.crop(*self.search_region, self.mode)
+        images = self.images if self.active_images is None else self.active_images
+        mode = (settings.cooldowns.currentMode(), tuple(images))
+        self.searched_area = 0
+        self.reused = False
+        # same pixels as last time, matching again would give the same answer
+        if not region_changes.changed(self.label, screenshot) and self.last_detection and self.last_detection[0] == mode:
+            _, self.found, outputs, self.detected_image_name = self.last_detection
+            self.reused = True
+            return self.found, {image: (confidence, 0.0) for image, (confidence, _) in outputs.items()}
+        # one decisive match starts the timer, the templates after it can't change that
+        early_exit = not self.full_scan()
+        order = self.template_order(images) if early_exit else images
+        # look where the templates were last time first (the bottle doesn't move), the whole region only on a miss or every few ticks
+        if early_exit and self.locations and self.since_full_search < settings.prior_refresh:
+            self.since_full_search += 1
+            outputs = await self.prior_search(screenshot, order)
+            if self.found:
+                self.last_detection = (mode, self.found, outputs, self.detected_image_name)
+                return self.found, outputs
+        self.since_full_search = 0
+        self.searched_area += screenshot.shape[0] * screenshot.shape[1]
+        outputs = {}
+        engine = self.pyramid or self.template_set
+        if engine:
+            results = await match_pool.run(engine.match, screenshot, order, self.confidence if early_exit else None)
+            for image, (max_conf, max_loc, seconds) in results.items():
+                if self.check_match(image, screenshot, max_conf, max_loc):
+                    self.hit(image, max_loc)
+                outputs[image] = (max_conf, seconds)
+        elif early_exit:
+            for image in order:
+                outputs.update(await self.detect_image_task(image, screenshot))
+                if self.found:
+                    break
+        else:
+            tasks = [self.detect_image_task(image, screenshot) for image in images]
+            outputs = await asyncio.gather(*tasks)
+            outputs = {k: v for output in outputs for k, v in output.items()}
+        self.last_detection = (mode, self.found, outputs, self.detected_image_name)
         return self.found, outputs
     
     def start_timer_timedelta(self, output, timedelta: datetime.timedelta) -> bool:
@@ -1,9 +1,9 @@
+import datetime
 from threading import Timer
 import threading
 import time
 from timers.Dota2_Timer import Dota2_Timer
 from utils.cooldown import Respawn_Duration
-from utils.screen_areas import area_events
 from utils.settings import settings
 from utils.terminal import TerminalWindow
 from playsound import playsound
@@ -15,10 +15,13 @@ class RoshanTimer(Dota2_Timer):
     def __init__(self, name: str):
         super().__init__(name)
         self.trigger_images(["images\\roshan\\roshan.png"])
-        self.search_area(*area_events)
+        self.use_area("area_events")
         self.audio_alert(["./audio/roshan/roshan_respawn_3min.mp3", "./audio/roshan/roshan_respawn.mp3"])
         self.history = True
         self.confidence = 0.95
+        self.pyramid_search(settings.pyramid_levels)
+        self.cadence = 2.0  # the kill feed keeps the banner up for a while
+        self.priority = 2
         self.timeout(settings.cooldowns.roshan_cooldown)
         self.played_audio_alert = False
         
@@ -28,6 +31,12 @@ class RoshanTimer(Dota2_Timer):
 
 
    
+    def rearm_at(self):
+        # dead for at least duration - 3 min after the last kill, can respawn (and die again) after that
+        if self.timers:
+            return max(self.timers) + datetime.timedelta(seconds=self.duration() - 180)
+        return super().rearm_at()
+
     def writeProgressBar(self, window: TerminalWindow, time_remaining: float, longest_name: int, scheduledTimer: Timer):
         # roshan timer is 8-11 minutes, so we need to calculate progress
         
@@ -1,7 +1,6 @@
 from timers.Dota2_Timer import Dota2_Timer
 from utils.settings import settings
-import os
-from utils.screen_areas import area_items
+from utils.template_bank import template_bank
 
 # rune_timer = Dota2_Timer("Rune", settings)
 # rune_timer.trigger_images(
@@ -29,10 +28,9 @@ from utils.screen_areas import area_items
 class Rune_Timer(Dota2_Timer):
     def __init__(self, name: str):
         super().__init__(name)
-        self.trigger_images(
-            [os.path.join("images\\bottle\\runes", img) for img in os.listdir("images\\bottle\\runes")]
-        )
+        self.trigger_images(template_bank.images_in("images\\bottle\\runes"))
         self.timeout(settings.cooldowns.rune_cooldown)
-        self.search_area(*area_items)
+        self.use_area("area_items")
+        self.cadence = 0.5
         self.audio_alert("./audio/bottle/rune_expiring.mp3")
         self.disabled = True
\ No newline at end of file
@@ -1,15 +1,13 @@
 from collections import deque
 from timers.Dota2_Timer import Dota2_Timer
-import os
-import time
 import datetime
 from threading import Timer
 from utils.cooldown import Mode
-from utils.screen_areas import area_events_truncated
 from utils.settings import settings
 from utils.terminal import TerminalWindow
-import easyocr
-import cv2 as cv
+from utils.ocr import ocr
+from utils.side_classifier import SideClassifier, _side
+from utils.template_bank import template_bank
 import threading
 from playsound import playsound
 
@@ -17,41 +15,61 @@ class TormentorTimer(Dota2_Timer):
     # 2 concurrent timers, one for each tormentor. The radiant/dire tormentor respawns every 10 minutes.
     def __init__(self, name: str):
         super().__init__(name)
-        self.trigger_images([os.path.join("images\\tormentor", img) for img in os.listdir("images\\tormentor")])
-        self.search_area(*area_events_truncated)
+        self.trigger_images(template_bank.images_in("images\\tormentor"))
+        self.use_area("area_events_truncated")
         self.timeout(settings.cooldowns.tormentor_cooldown)
         self.history = True
         self.confidence = 0.85
         self.max_instances = 2
         self.spawn_at = settings.cooldowns.tormentor_spawn_at
-        self.reader = easyocr.Reader(["en"])
+        self.pyramid_search(settings.pyramid_levels)
+        self.cadence = 2.0
+        self.priority = 2
+        self.reader = ocr
+        self.side_classifier = SideClassifier(self.image_files)
     
         
     
-    # modified to OCR the image and detect which team killed the tormentor
-    async def detect_image_task(self, image, screenshot):
-        output = {}
-        start = time.time()
-        template = self.image_files[image]
-        result = cv.matchTemplate(screenshot, template, cv.TM_CCOEFF_NORMED)
-        _, max_conf, _, maxLoc = cv.minMaxLoc(result)
-        
-        
-               
-        
+    def down_sides(self) -> set:
+        """Sides whose tormentor is dead right now (its timer is running)."""
+        return {timer.getName() for timer in self.timers.values()}
+
+    def candidate_images(self) -> list:
+        # only the tormentor that is still up can die
+        down = self.down_sides()
+        return [image for image in self.images if _side(image) not in down]
+
+    def rearm_at(self):
+        if self.started < self.max_instances and self.candidate_images():
+            return super().rearm_at()
+        if self.timers:
+            return min(self.timers) + datetime.timedelta(seconds=self.duration())
+        return None
+
+    def reload_templates(self):
+        super().reload_templates()
+        self.side_classifier = SideClassifier(self.image_files)
+
+    # modified to detect which team's tormentor was killed, OCR only if the banner doesn't tell us
+    def check_match(self, image, screenshot, max_conf, maxLoc) -> bool:
+        template = self.templates[image]
         if max_conf >= self.confidence or settings.cooldowns.currentMode() == Mode.DEBUG :  # Confidence threshold
             self.found = True
-            # OCR the best match to determine which team killed the tormentor
             detected_image = screenshot[maxLoc[1]:maxLoc[1] + template.shape[0], maxLoc[0]:maxLoc[0] + template.shape[1]]
-            result = self.reader.readtext(detected_image, detail=0)
-            if len(result) > 0:
-                print(result)
-                if "dire" in result[0].lower():
-                    self.detected_image_name = "Dire Tormentor"    
-                else:
-                    self.detected_image_name = "Radiant Tormentor"
-            output[image] = (max_conf, time.time() - start)
-        return output
+            side, _ = self.side_classifier.classify(detected_image, image)
+            if side:
+                self.detected_image_name = side
+            else:
+                # OCR the best match to determine which team killed the tormentor
+                result = self.reader.readtext(detected_image, detail=0)
+                if len(result) > 0:
+                    print(result)
+                    if "dire" in result[0].lower():
+                        self.detected_image_name = "Dire Tormentor"    
+                    else:
+                        self.detected_image_name = "Radiant Tormentor"
+            return True
+        return False
     
     # TODO: modify to color the tormentor timer based on the team that killed it, and name it accordingly
     def writeProgressBar(self, window: TerminalWindow, time_remaining: float, longest_name: int, scheduledTimer: Timer):
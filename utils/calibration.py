@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Optional
+import numpy as np
+import cv2 as cv
+import pyautogui
+from utils import screen_areas
+from utils.capture import Frame, Rect
+
+REFERENCE = (2560, 1440)  # the screen the areas in utils/screen_areas.py were measured on
+# how every area moves with the screen: the hud scales with the height, the clock and items are centered, the kill feed sticks to the left
+ANCHORS = {"area_time": "top", "area_items": "bottom", "area_events": "left"}
+TEXT_THRESHOLD = 200
+CLOCK_PAD = 4
+ITEMS_PAD = 10
+ITEMS_CONFIDENCE = 0.8
+FAILURE_STREAK = 10  # clock reads in a row that make no sense before we look for the hud again
+RETRY_SECONDS = 30.0
+# template scales tried by the probe, relative to what the resolution alone says (hud scale setting)
+SCALE_STEPS = (0.8, 0.9, 1.0, 1.1, 1.25)
+PROBE_CONFIDENCE = 0.85
+PROBE_SECONDS = 5.0
+PROBE_ATTEMPTS = 6  # probes without a confident match before we settle for the resolution (no bottle to find)
+SCALE_MISS_STREAK = 100  # misses in a row in the inventory, where templates matched before, before a probed scale is dropped
+REGION_MISS_STREAK = 600  # same for any region before we look for the hud again (roshan can be alive for a long time)
+
+
+def _scale(rect: Rect, anchor: str, screen: tuple[int, int]) -> Rect:
+    x, y, w, h = rect
+    s = screen[1] / REFERENCE[1]
+    if anchor == "left":
+        nx, ny = x * s, y * s
+    else:
+        nx = screen[0] / 2 + (x - REFERENCE[0] / 2) * s
+        ny = y * s if anchor == "top" else screen[1] - (REFERENCE[1] - y) * s
+    return (int(round(nx)), int(round(ny)), int(round(w * s)), int(round(h * s)))
+
+
+def resized(template: np.ndarray, scale: float) -> np.ndarray:
+    h, w = template.shape[:2]
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv.resize(template, size, interpolation=cv.INTER_AREA if scale < 1 else cv.INTER_CUBIC)
+
+
+def _truncated(events: Rect, screen: tuple[int, int]) -> Rect:
+    """Only the last few kill feed entries, same cut as utils/screen_areas.py."""
+    cut = int(round(378 * screen[1] / REFERENCE[1]))
+    x, y, w, h = events
+    return (x, y + cut, w, h - cut)
+
+
+def _at_least(rect: Rect, default: Rect) -> Rect:
+    """Same center, but at least as big as the default. The clock grows from m:ss to mm:ss to h:mm:ss around its center."""
+    x, y, w, h = rect
+    width, height = max(w, default[2]), max(h, default[3])
+    return (int(round(x + (w - width) / 2)), int(round(y + (h - height) / 2)), width, height)
+
+
+def find_clock(frame: Frame, default: Rect) -> Optional[Rect]:
+    """
+    Box of the clock: the bright text blob closest to the top center of the screen, centered on it
+    and at least as big as the default so the clock still fits once it gets longer."""
+    screen_w, screen_h = frame.screen
+    s = screen_h / REFERENCE[1]
+    band = (int(screen_w / 2 - 160 * s), 0, int(320 * s), int(default[1] + default[3] + 40 * s))
+    if not frame.contains(band):
+        return None
+    gray = cv.cvtColor(frame.crop(*band), cv.COLOR_BGR2GRAY)
+    mask = (gray > TEXT_THRESHOLD).astype(np.uint8)
+    # glue the digits and the colon into one blob
+    mask = cv.morphologyEx(mask, cv.MORPH_CLOSE, np.ones((1, max(3, int(8 * s))), np.uint8))
+    count, _, stats, _ = cv.connectedComponentsWithStats(mask)
+    best = None
+    for x, y, w, h, _ in stats[1:count]:
+        if not (8 * s <= h <= 30 * s and 20 * s <= w <= 140 * s):
+            continue
+        distance = abs(band[0] + x + w / 2 - screen_w / 2)
+        if best is None or distance < best[0]:
+            best = (distance, (band[0] + x - CLOCK_PAD, band[1] + y - CLOCK_PAD, w + 2 * CLOCK_PAD, h + 2 * CLOCK_PAD))
+    return _at_least(tuple(int(v) for v in best[1]), default) if best else None
+
+
+def find_items(frame: Frame, default: Rect, templates: dict[str, np.ndarray]) -> Optional[Rect]:
+    """
+    The inventory moved so the bottle is in it: the whole inventory height (both rows, the bottle can change rows)
+    and at least its width (it can change slots), only the origin follows the match."""
+    x, y, w, h = default
+    search = (x - w // 4, y - h // 2, w + w // 2, h * 2)
+    if not frame.contains(search) or not templates:
+        return None
+    roi = frame.crop(*search)
+    best = (ITEMS_CONFIDENCE, None)
+    for template in templates.values():
+        th, tw = template.shape[:2]
+        if th > roi.shape[0] or tw > roi.shape[1]:
+            continue
+        _, conf, _, loc = cv.minMaxLoc(cv.matchTemplate(roi, template, cv.TM_CCOEFF_NORMED))
+        if conf >= best[0]:
+            best = (conf, (search[0] + loc[0], search[1] + loc[1], tw, th))
+    if best[1] is None:
+        return None
+    mx, my, tw, th = best[1]
+    x0, x1 = min(x, mx - ITEMS_PAD), max(x + w, mx + tw + ITEMS_PAD)
+    # shift the rows only as far as needed to have the bottle inside
+    y0 = min(y, my - ITEMS_PAD)
+    y0 = max(y0, my + th + ITEMS_PAD - h)
+    return tuple(int(v) for v in (x0, y0, x1 - x0, h))
+
+
+class HudRegions:
+    """
+    Where the clock, the inventory and the kill feed are on this screen.
+    Starts from utils/screen_areas.py scaled to the screen, calibrate() looks for the real hud in a full frame
+    (needs a game on screen) and the result is kept in cache/hud_regions.json per resolution.
+    A streak of clock reads that make no sense, or of template misses in a region where they matched before,
+    means the hud moved, and calibration runs again.
+    Also keeps the scale of the templates for this screen, found once by probe_scale() and cached the same way
+    (dropped again if the inventory templates keep missing at that scale)."""
+
+    def __init__(self, path: str = os.path.join("cache", "hud_regions.json")):
+        self.path = path
+        self.screen = None
+        self.calibrated = False
+        self.source = "defaults"
+        self.failures = 0
+        self.last_attempt = 0.0
+        self.scale = 1.0
+        self.scale_source = "resolution"
+        self.scale_probed = False
+        self.last_probe = 0.0
+        self.probe_attempts = 0
+        self.misses = {}  # area -> detections in a row without a match
+        self.matched = set()  # areas where a template matched since they were last calibrated
+        self.area_time = screen_areas.area_time
+        self.area_items = screen_areas.area_items
+        self.area_events = screen_areas.area_events
+        self.area_events_truncated = screen_areas.area_events_truncated
+
+    @staticmethod
+    def key(screen: tuple[int, int]) -> str:
+        return f"{screen[0]}x{screen[1]}"
+
+    def defaults(self, screen: tuple[int, int]):
+        self.screen = tuple(screen)
+        for name, anchor in ANCHORS.items():
+            setattr(self, name, _scale(getattr(screen_areas, name), anchor, screen))
+        self.area_events_truncated = _truncated(self.area_events, screen)
+        self.scale = self.prior_scale()
+
+    def prior_scale(self) -> float:
+        """What the resolution alone says the template scale is."""
+        return round(self.screen[1] / REFERENCE[1], 4)
+
+    def _cache(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, screen: tuple[int, int]) -> bool:
+        """Regions for this screen, from the cache if it was calibrated before."""
+        self.defaults(screen)
+        regions = self._cache().get(self.key(screen), {})
+        if "scale" in regions:
+            self.scale = regions["scale"]
+            self.scale_source = "cached"
+            self.scale_probed = True
+        if not all(name in regions for name in ANCHORS):
+            return False
+        for name in ANCHORS:
+            setattr(self, name, tuple(regions[name]))
+        # clocks cached before they were kept at the default size
+        self.area_time = _at_least(self.area_time, _scale(screen_areas.area_time, ANCHORS["area_time"], self.screen))
+        self.area_events_truncated = _truncated(self.area_events, self.screen)
+        self.calibrated = True
+        self.source = "cached"
+        return True
+
+    def save(self):
+        cache = self._cache()
+        entry = {name: list(getattr(self, name)) for name in ANCHORS} if self.calibrated else {}
+        if self.scale_probed:
+            entry["scale"] = self.scale
+        cache[self.key(self.screen)] = entry
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w") as f:
+                json.dump(cache, f, indent=2)
+        except OSError:
+            pass  # calibrating again next launch is fine
+
+    def calibrate(self, frame: Frame, item_templates: dict[str, np.ndarray] = None, validate=None) -> bool:
+        """
+        Find the hud in a full frame. The clock anchors everything, without it nothing changes.
+        validate(crop) can reject a clock candidate, so white text in the menu doesn't get cached as the clock."""
+        self.last_attempt = time.time()
+        fallback = HudRegions(self.path)
+        fallback.defaults(frame.screen)
+        clock = find_clock(frame, fallback.area_time)
+        if clock is None or (validate and not validate(frame.crop(*clock))):
+            return False
+        self.screen = tuple(frame.screen)
+        self.area_time = clock
+        self.area_items = find_items(frame, fallback.area_items, item_templates or {}) or fallback.area_items
+        # the kill feed is empty most of the time, nothing to find there
+        self.area_events = fallback.area_events
+        self.area_events_truncated = fallback.area_events_truncated
+        self.calibrated = True
+        self.source = "calibrated"
+        self.failures = 0
+        self.misses = {}
+        self.matched = set()
+        self.save()
+        return True
+
+    def scale_candidates(self) -> list[float]:
+        prior = self.screen[1] / REFERENCE[1]
+        return sorted({round(prior * step, 4) for step in SCALE_STEPS})
+
+    def probe_scale(self, frame: Frame, targets: list[tuple[Rect, dict[str, np.ndarray]]]) -> Optional[float]:
+        """
+        targets are (region, templates as captured). Every template is matched at every candidate scale,
+        the best match decides the scale (cached until it keeps missing), as long as it is a confident one. None if nothing matched."""
+        self.last_probe = time.time()
+        self.probe_attempts += 1
+        best = (PROBE_CONFIDENCE, None)
+        for region, templates in targets:
+            if not frame.contains(region):
+                continue
+            roi = frame.crop(*region)
+            for template in templates.values():
+                for scale in self.scale_candidates():
+                    scaled = resized(template, scale)
+                    if scaled.shape[0] > roi.shape[0] or scaled.shape[1] > roi.shape[1]:
+                        continue
+                    _, conf, _, _ = cv.minMaxLoc(cv.matchTemplate(roi, scaled, cv.TM_CCOEFF_NORMED))
+                    if conf > best[0]:
+                        best = (conf, scale)
+        if best[1] is None:
+            if self.probe_attempts >= PROBE_ATTEMPTS:
+                self.scale_source = f"resolution, nothing matched in {PROBE_ATTEMPTS} probes"
+            return None
+        self.scale = best[1]
+        self.scale_source = f"probed {best[0]:.2f}"
+        self.scale_probed = True
+        self.save()
+        return self.scale
+
+    def probe_due(self) -> bool:
+        # at the reference resolution the templates fit as captured, and after a few misses we go by the resolution
+        if self.scale_probed or self.prior_scale() == 1.0 or self.probe_attempts >= PROBE_ATTEMPTS:
+            return False
+        return time.time() - self.last_probe >= PROBE_SECONDS
+
+    def template_result(self, area: str, found: bool):
+        """
+        A timer searched its area. A streak of misses where templates matched before means the scale
+        (or the region, see due()) is off, a probed scale is dropped and probed again."""
+        if found:
+            self.misses[area] = 0
+            self.matched.add(area)
+            return
+        if area not in self.matched:
+            return
+        self.misses[area] = self.misses.get(area, 0) + 1
+        if area == "area_items" and self.scale_probed and self.misses[area] >= SCALE_MISS_STREAK:
+            self.scale = self.prior_scale()
+            self.scale_source = "resolution, the probed scale kept missing"
+            self.scale_probed = False
+            self.probe_attempts = 0
+            self.misses[area] = 0
+            self.matched.discard(area)
+            self.save()  # without the scale, the next launch probes again
+
+    def clock_read(self, ok: bool):
+        self.failures = 0 if ok else self.failures + 1
+
+    def due(self) -> bool:
+        """Time to look for the hud: never found it, the clock region stopped making sense or templates stopped matching."""
+        if time.time() - self.last_attempt < RETRY_SECONDS:
+            return False
+        lost = any(streak >= REGION_MISS_STREAK for streak in self.misses.values())
+        return not self.calibrated or self.failures >= FAILURE_STREAK or lost
+
+    def summary(self) -> str:
+        return f"HUD regions ({self.source}, {self.key(self.screen)}): clock {self.area_time}, items {self.area_items}, template scale {self.scale:g} ({self.scale_source})"
+
+
+hud = HudRegions()
+hud.load(tuple(pyautogui.size()))
+
+
+if __name__ == "__main__":
+    # calibrate from a screenshot file: python -m utils.calibration screenshot.png
+    import sys
+    from utils.template_bank import template_bank
+
+    image = cv.imread(sys.argv[1], cv.IMREAD_COLOR)
+    frame = Frame([((0, 0, image.shape[1], image.shape[0]), image)], (image.shape[1], image.shape[0]))
+    native = template_bank.native()
+    templates = {path: native.get(path) for folder in ("images\\bottle\\normal", "images\\bottle\\runes") for path in native.images_in(folder)}
+    regions = HudRegions(os.devnull)
+    regions.defaults(frame.screen)
+    start = time.perf_counter()
+    scale = regions.probe_scale(frame, [(regions.area_items, templates)])
+    print(f"{'probed scale' if scale else 'no bottle found, scale from the resolution'} {regions.scale:g} in {(time.perf_counter() - start) * 1000:.1f}ms")
+    start = time.perf_counter()
+    found = regions.calibrate(frame, {path: resized(template, regions.scale) for path, template in templates.items()})
+    print(f"{'found the clock' if found else 'no clock found, scaled defaults'} in {(time.perf_counter() - start) * 1000:.1f}ms")
+    print(regions.summary())
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import numpy as np
+import pyautogui
+from utils.match_modes import MatchMode, convert
+
+# (x, y, width, height) in screen coordinates, same layout as utils/screen_areas.py
+Rect = tuple[int, int, int, int]
+
+
+def _intersects(a: Rect, b: Rect) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def _bounding_box(a: Rect, b: Rect) -> Rect:
+    x, y = min(a[0], b[0]), min(a[1], b[1])
+    return (x, y, max(a[0] + a[2], b[0] + b[2]) - x, max(a[1] + a[3], b[1] + b[3]) - y)
+
+
+def _clamp(rect: Rect, screen: tuple[int, int]) -> Rect:
+    x, y, w, h = rect
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(screen[0], x + w), min(screen[1], y + h)
+    return (x0, y0, max(0, x1 - x0), max(0, y1 - y0))
+
+
+def merge_regions(regions: list[Rect], screen: tuple[int, int]) -> list[Rect]:
+    """Clamp regions to the screen and merge overlapping ones, so every pixel is grabbed once."""
+    merged = [_clamp(r, screen) for r in regions]
+    merged = [r for r in merged if r[2] > 0 and r[3] > 0]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                if _intersects(merged[i], merged[j]):
+                    merged[i] = _bounding_box(merged[i], merged.pop(j))
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+class Frame:
+    """
+    Pixels for a handful of screen rectangles, addressed in screen coordinates.
+    Patches are kept in the backend's native channel order (`order`), color conversion
+    only happens on the cropped region that is actually searched."""
+
+    def __init__(self, patches: list[tuple[Rect, np.ndarray]], screen: tuple[int, int], order: str = "BGR"):
+        self.patches = patches
+        self.screen = screen
+        self.order = order
+
+    def pixels(self, rect: Rect):
+        """View of a region in the native channel order, None if it wasn't captured."""
+        cx, cy, cw, ch = _clamp(rect, self.screen)
+        for (px, py, pw, ph), image in self.patches:
+            if px <= cx and py <= cy and cx + cw <= px + pw and cy + ch <= py + ph:
+                return image[cy - py : cy - py + ch, cx - px : cx - px + cw]
+        return None
+
+    def contains(self, rect: Rect) -> bool:
+        return self.pixels(rect) is not None
+
+    def crop(self, x, y, width, height, mode: MatchMode = MatchMode.COLOR) -> np.ndarray:
+        image = self.pixels((x, y, width, height))
+        if image is None:
+            raise ValueError(f"Region {(x, y, width, height)} was not captured")
+        return convert(image, mode, self.order)
+
+    def area(self) -> int:
+        """Number of pixels grabbed for this frame."""
+        return sum(w * h for (_, _, w, h), _ in self.patches)
+
+
+class CaptureBackend:
+    name = "base"
+    order = "BGR"  # channel order of the frames it grabs
+    regions = False  # grabs only the requested rectangles, a small grab is cheap
+
+    def __init__(self):
+        self.screen = tuple(pyautogui.size())
+
+    def grab(self, regions: list[Rect]) -> Frame:
+        raise NotImplementedError
+
+
+class PyAutoGUICapture(CaptureBackend):
+    """Full-frame fallback, this is what we always did: one desktop screenshot per tick."""
+
+    name = "pyautogui"
+    order = "RGB"
+
+    def grab(self, regions: list[Rect]) -> Frame:
+        s = np.array(pyautogui.screenshot())
+        return Frame([((0, 0, s.shape[1], s.shape[0]), s)], (s.shape[1], s.shape[0]), self.order)
+
+
+class MSSCapture(CaptureBackend):
+    """
+    Grabs only the requested rectangles with mss (native grabbers on Windows/X11/macOS).
+    The mss handle is created lazily, because it has to live on the thread that uses it."""
+
+    name = "mss"
+    order = "BGRA"
+    regions = True
+
+    def __init__(self):
+        import mss  # optional dependency, checked by create_backend
+
+        self._mss_module = mss
+        self._sct = None
+        super().__init__()
+
+    def grab(self, regions: list[Rect]) -> Frame:
+        if self._sct is None:
+            self._sct = self._mss_module.mss()
+        patches = []
+        for x, y, w, h in merge_regions(regions, self.screen):
+            shot = self._sct.grab({"left": x, "top": y, "width": w, "height": h})
+            patches.append(((x, y, w, h), np.asarray(shot)))
+        return Frame(patches, self.screen, self.order)
+
+
+def create_backend(name: str = "auto") -> CaptureBackend:
+    """Pick a capture backend by name, "auto" prefers mss and falls back to pyautogui."""
+    if name in ("auto", "mss"):
+        try:
+            return MSSCapture()
+        except ImportError:
+            if name == "mss":
+                raise
+    return PyAutoGUICapture()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from collections import defaultdict
+import threading
+import numpy as np
+import cv2 as cv
+from utils.settings import settings
+
+
+class RegionChangeDetector:
+    """
+    Keeps a cheap fingerprint (4x downsampled grayscale) of every region we process,
+    so callers can reuse their previous results when the pixels did not change."""
+
+    def __init__(self, threshold: float = 8.0, downsample: int = 4):
+        self.threshold = threshold
+        self.downsample = downsample
+        self.fingerprints = dict[str, np.ndarray]()
+        self.reused = defaultdict(int)
+        self.processed = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def fingerprint(self, image: np.ndarray) -> np.ndarray:
+        if image.ndim == 3:
+            image = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+        scale = 1 / self.downsample
+        return cv.resize(image, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+
+    def changed(self, key: str, image: np.ndarray) -> bool:
+        """
+        True if the region looks different from the last time it was processed (or was never seen).
+        The stored fingerprint is only replaced on a change, so slow drift still adds up."""
+        if self.threshold < 0:  # gating disabled
+            return True
+        fingerprint = self.fingerprint(image)
+        with self._lock:
+            previous = self.fingerprints.get(key)
+            if (
+                previous is None
+                or previous.shape != fingerprint.shape
+                or cv.absdiff(previous, fingerprint).max() > self.threshold
+            ):
+                self.fingerprints[key] = fingerprint
+                self.processed[key] += 1
+                return True
+            self.reused[key] += 1
+            return False
+
+    def forget(self, key: str):
+        with self._lock:
+            self.fingerprints.pop(key, None)
+
+    def summary(self) -> list[str]:
+        """One line per region for the confidence window."""
+        return [
+            f"{key}: {self.reused[key]} reused / {self.processed[key]} processed"
+            for key in sorted(self.processed)
+        ]
+
+
+region_changes = RegionChangeDetector(settings.change_threshold)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from collections import deque
+import datetime
+import os
+import time
+from typing import Optional
+import numpy as np
+import cv2 as cv
+
+GLYPHS = "0123456789:"
+CELL_WIDTH, CELL_HEIGHT = 10, 16
+MAX_RATE = 20.0  # game seconds per wall second, fastest replay speed plus some slack
+
+
+def parse_game_time(game_time: str) -> Optional[datetime.timedelta]:
+    """Parse a dota 2 clock (5:36:30 h:m:s or 6:30 m:s), None if it doesn't look like one."""
+    actual_time = game_time.split(":")
+    # check if length is 2 or 3 and all parts are numbers
+    if all([part.isdigit() for part in actual_time]) and len(actual_time) > 1 and len(actual_time) < 4:
+        if len(actual_time) == 3:
+            return datetime.timedelta(
+                hours=int(actual_time[0]),
+                minutes=int(actual_time[1]),
+                seconds=int(actual_time[2]),
+            )
+        return datetime.timedelta(hours=0, minutes=int(actual_time[0]), seconds=int(actual_time[1]))
+    return None
+
+
+class ClockReader:
+    """
+    Reads the HUD clock by cutting it into glyph cells and comparing every cell with a small bank of digit templates.
+    The bank is learned from clock reads that easyocr already did (every digit shows up within the first minute),
+    and kept on disk so the next launch can skip easyocr right away.
+    A read only goes into the bank once `confirmations` reads in a row agree with each other (the clock
+    didn't go back or jump further than the replay speed allows), a single misread would stick around for good."""
+
+    def __init__(self, bank_path: str = os.path.join("cache", "clock_digits.npz"), min_confidence: float = 0.85, min_margin: float = 0.03, examples: int = 8, confirmations: int = 3):
+        self.bank_path = bank_path
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.bank = {glyph: deque(maxlen=examples) for glyph in GLYPHS}
+        self._matrix = None  # (cells, labels), rebuilt when the bank changes
+        self._unsaved = 0
+        self.confirmations = confirmations
+        self.pending = []  # (image, text) of the current streak, not learned yet
+        self.streak = 0
+        self.last = None  # (wall, game seconds) of the last easyocr read
+        self.load()
+
+    def complete(self) -> bool:
+        return all(self.bank[glyph] for glyph in GLYPHS)
+
+    def segment(self, image: np.ndarray) -> list[np.ndarray]:
+        """Split the clock into one normalized cell per glyph, left to right."""
+        gray = image if image.ndim == 2 else cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+        # the clock is light text on the dark hud
+        _, mask = cv.threshold(gray, 0, 255, cv.THRESH_BINARY + cv.THRESH_OTSU)
+        columns = np.flatnonzero(mask.any(axis=0))
+        if len(columns) == 0:
+            return []
+        # runs of adjacent text columns are glyphs
+        breaks = np.flatnonzero(np.diff(columns) > 1)
+        starts = np.concatenate(([columns[0]], columns[breaks + 1]))
+        ends = np.concatenate((columns[breaks], [columns[-1]])) + 1
+        cells = []
+        for start, end in zip(starts, ends):
+            rows = np.flatnonzero(mask[:, start:end].any(axis=1))
+            cell = gray[rows[0] : rows[-1] + 1, start:end].astype(np.float32)
+            cell = cv.resize(cell, (CELL_WIDTH, CELL_HEIGHT), interpolation=cv.INTER_AREA).ravel()
+            cell -= cell.mean()
+            norm = np.linalg.norm(cell)
+            cells.append(cell / norm if norm else cell)
+        return cells
+
+    def read(self, image: np.ndarray) -> tuple[Optional[str], float]:
+        """
+        Returns (text, confidence) with confidence the worst cell score,
+        text is None when the bank is incomplete or any cell is ambiguous."""
+        if not self.complete():
+            return None, 0.0
+        cells = self.segment(image)
+        if len(cells) < 4:  # m:ss at least
+            return None, 0.0
+        if self._matrix is None:
+            labels = [glyph for glyph in GLYPHS for _ in self.bank[glyph]]
+            self._matrix = (np.stack([cell for glyph in GLYPHS for cell in self.bank[glyph]]), np.array(labels))
+        bank, labels = self._matrix
+        scores = np.stack(cells) @ bank.T
+        # best score per glyph for every cell
+        per_glyph = np.stack([scores[:, labels == glyph].max(axis=1) for glyph in GLYPHS], axis=1)
+        order = np.argsort(per_glyph, axis=1)
+        best = per_glyph[np.arange(len(cells)), order[:, -1]]
+        second = per_glyph[np.arange(len(cells)), order[:, -2]]
+        confidence = float(best.min())
+        if confidence < self.min_confidence or float((best - second).min()) < self.min_margin:
+            return None, confidence
+        return "".join(GLYPHS[i] for i in order[:, -1]), confidence
+
+    def learn(self, image: np.ndarray, text: str):
+        """Add the cells of a clock that was read some other way (easyocr) to the bank."""
+        if parse_game_time(text) is None:
+            return
+        cells = self.segment(image)
+        if len(cells) != len(text):
+            return
+        new_glyph = False
+        for glyph, cell in zip(text, cells):
+            new_glyph |= not self.bank[glyph]
+            self.bank[glyph].append(cell)
+        self._matrix = None
+        self._unsaved += 1
+        if new_glyph or self._unsaved >= 50:
+            self.save()
+
+    def confirm(self, image: np.ndarray, text: str, wall: float = None):
+        """An easyocr read, learned once it is part of a streak of reads that fit together."""
+        game_time = parse_game_time(text)
+        if game_time is None:
+            self.pending.clear()
+            self.streak = 0
+            self.last = None
+            return
+        wall = time.time() if wall is None else wall
+        seconds = game_time.total_seconds()
+        if self.last is not None and 0 <= seconds - self.last[1] <= max(2.0, MAX_RATE * (wall - self.last[0])):
+            self.streak += 1
+        else:
+            self.pending.clear()
+            self.streak = 1
+        self.last = (wall, seconds)
+        self.pending.append((image, text))
+        if self.streak >= self.confirmations:
+            for image, text in self.pending:
+                self.learn(image, text)
+            self.pending.clear()
+
+    def load(self):
+        try:
+            data = np.load(self.bank_path)
+        except (OSError, ValueError):
+            return
+        for label, cell in zip(data["labels"], data["cells"]):
+            if label in self.bank and cell.shape == (CELL_WIDTH * CELL_HEIGHT,):
+                self.bank[str(label)].append(cell)
+
+    def save(self):
+        self._unsaved = 0
+        labels = [glyph for glyph in GLYPHS for _ in self.bank[glyph]]
+        if not labels:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.bank_path) or ".", exist_ok=True)
+            np.savez(self.bank_path, labels=np.array(labels), cells=np.stack([cell for glyph in GLYPHS for cell in self.bank[glyph]]))
+        except OSError:
+            pass  # not being able to cache the bank is not a reason to stop reading the clock
+
+
+def read_clock(image: np.ndarray, digits: Optional[ClockReader], reader) -> tuple[Optional[str], str]:
+    """Read the clock with the digit templates, easyocr only when they aren't sure (or not learned yet). Returns (text, source)."""
+    if digits is not None:
+        text, confidence = digits.read(image)
+        if text is not None:
+            return text, f"digits {confidence:.2f}"
+    result = reader.readtext(image, detail=0)
+    if len(result) > 0:
+        game_time = result[0].replace(".", ":")
+        if digits is not None:
+            digits.confirm(image, game_time)
+        return game_time, "easyocr"
+    return None, "easyocr"
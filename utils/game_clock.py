@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from collections import deque
+import datetime
+import threading
+import time
+from typing import Optional
+import numpy as np
+
+# replay speeds dota offers, the fitted rate snaps to these when it's close
+SPEEDS = (0.0, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0)
+
+
+class GameClock:
+    """
+    Model of the in-game clock: a line fitted through recent (wall time, clock read) samples.
+    It extrapolates the game time at any instant, so the UI stays smooth between reads
+    and reads are only needed to confirm or correct the model.
+
+    A read that doesn't fit the line is held back as a possible misread,
+    if the next read agrees with it the game was paused/sped up/scrubbed and the model restarts from those two."""
+
+    def __init__(self, window: int = 8, tolerance: float = 1.5, max_rate: float = 20.0, max_extrapolation: float = 5.0):
+        self.samples = deque(maxlen=window)  # (wall, game seconds) inliers of the current regime
+        self.tolerance = tolerance  # game seconds, reads are truncated to whole seconds
+        self.max_rate = max_rate
+        self.max_extrapolation = max_extrapolation  # wall seconds we keep extrapolating without a read
+        self.rate = 1.0
+        self.pending = None
+        self.rejected = 0
+        self._line = None  # (wall, game) point the line goes through
+        self._lock = threading.Lock()
+
+    @property
+    def last_read(self) -> Optional[float]:
+        return self.samples[-1][0] if self.samples else None
+
+    def locked(self) -> bool:
+        """True once the current regime has enough reads to trust the extrapolation."""
+        return len(self.samples) >= 3
+
+    def due(self, confirm_interval: float, wall: Optional[float] = None) -> bool:
+        """Should we read the clock now, or is the model good enough?"""
+        wall = time.time() if wall is None else wall
+        return not self.locked() or wall - self.last_read >= confirm_interval
+
+    def _predict(self, wall: float) -> float:
+        line_wall, line_game = self._line
+        # don't run away if the reads stopped coming (menu, alt-tab)
+        wall = min(wall, self.samples[-1][0] + self.max_extrapolation)
+        return line_game + self.rate * (wall - line_wall)
+
+    def _restart(self, *samples):
+        self.samples.clear()
+        self.samples.extend(samples)
+        self.pending = None
+        self._fit()
+
+    def _fit(self):
+        walls = np.array([wall for wall, _ in self.samples])
+        games = np.array([game for _, game in self.samples])
+        if len(self.samples) > 1 and np.ptp(walls) > 0:
+            rate = np.polyfit(walls - walls.mean(), games, 1)[0]
+            snapped = min(SPEEDS, key=lambda speed: abs(abs(rate) - speed))
+            if abs(abs(rate) - snapped) <= max(0.2 * snapped, 0.1):
+                rate = snapped if rate >= 0 else -snapped
+            self.rate = float(rate)
+        self._line = (walls.mean(), games.mean() + 0.5)  # reads are truncated, the real time is half a second later on average
+
+    def observe(self, game_time: datetime.timedelta, wall: Optional[float] = None) -> bool:
+        """Feed a clock read, returns False if it was held back as a likely misread."""
+        wall = time.time() if wall is None else wall
+        game = game_time.total_seconds()
+        with self._lock:
+            if not self.samples or wall - self.samples[-1][0] > self.max_extrapolation:
+                self._restart((wall, game))
+                return True
+            if abs(game - self._predict(wall) + 0.5) <= self.tolerance + abs(self.rate) * 0.1:
+                self.samples.append((wall, game))
+                self.pending = None
+                self._fit()
+                return True
+            if self.pending:
+                pending_wall, pending_game = self.pending
+                if wall > pending_wall and abs(game - pending_game) / (wall - pending_wall) <= self.max_rate:
+                    self._restart(self.pending, (wall, game))
+                    return True
+            self.pending = (wall, game)
+            self.rejected += 1
+            return False
+
+    def now(self, wall: Optional[float] = None) -> Optional[datetime.timedelta]:
+        """Estimated game time, None until the first read."""
+        with self._lock:
+            if not self.samples:
+                return None
+            return datetime.timedelta(seconds=max(0.0, self._predict(time.time() if wall is None else wall)))
+
+    def summary(self) -> str:
+        if not self.samples:
+            return "Clock model: no reads yet"
+        return (
+            f"Clock model: {self.rate:g}x, {len(self.samples)} reads"
+            f"{' (locked)' if self.locked() else ''}, {self.rejected} rejected, last read {time.time() - self.last_read:.1f}s ago"
+        )
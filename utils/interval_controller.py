@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from collections import deque
+import math
+import time
+from utils.settings import settings
+
+MIN_INTERVAL = 0.1  # seconds, detection itself takes about that long
+MAX_INTERVAL = 2.0  # paused games still get looked at this often, two ticks have to fit in the clock model's max_extrapolation
+STALL = 0.01  # a paused clock counts as this fraction of the game time we wanted, keeps the log finite
+
+
+class IntervalController:
+    """
+    Picks the time between detection ticks so every tick sees about 1 / target game seconds.
+    The plant is simple in log space: game seconds per tick = log(game speed) + log(interval),
+    so this is a PI loop on log(interval) in velocity form (the output is the integrator).
+    The interval is clamped to [minimum, maximum] and the clamped value is what the next step starts from,
+    so a long pause can't wind the controller up and 1x is back within a couple of ticks after it."""
+
+    def __init__(self, target: float, minimum: float = MIN_INTERVAL, maximum: float = MAX_INTERVAL, kp: float = 0.2, ki: float = 0.8, history: int = 256):
+        self.target = target  # samples per game second
+        self.minimum = minimum
+        self.maximum = maximum
+        self.kp = kp
+        self.ki = ki
+        self.interval = min(max(1.0 / target, minimum), maximum)
+        self.error = 0.0
+        self.saturated = 0
+        self.telemetry = deque(maxlen=history)  # (wall, interval used, game seconds it covered, next interval)
+
+    def update(self, advanced: float, wall: float = None) -> float:
+        """Game seconds the last tick covered, returns the interval until the next one."""
+        if advanced < 0:
+            # the clock went back (replay scrubbing, a misread): says nothing about the speed, start over from here
+            self.error = 0.0
+            self.telemetry.append((time.time() if wall is None else wall, self.interval, advanced, self.interval))
+            return self.interval
+        desired = 1.0 / self.target
+        error = math.log(desired / max(advanced, desired * STALL))
+        step = self.kp * (error - self.error) + self.ki * error
+        self.error = error
+        interval = self.interval * math.exp(step)
+        clamped = min(max(interval, self.minimum), self.maximum)
+        self.saturated += clamped != interval
+        self.telemetry.append((time.time() if wall is None else wall, self.interval, advanced, clamped))
+        self.interval = clamped
+        return clamped
+
+    def summary(self) -> str:
+        if not self.telemetry:
+            return f"Interval: {self.interval:.2f}s, no samples yet"
+        covered = [advanced for _, _, advanced, _ in self.telemetry]
+        return (
+            f"Interval: {self.interval:.2f}s for {self.target:g} samples per game second, "
+            f"last {covered[-1]:.2f} game s per sample (avg {sum(covered) / len(covered):.2f}), {self.saturated} clamped"
+        )
+
+
+interval_controller = IntervalController(settings.samples_per_game_second)
+
+
+if __name__ == "__main__":
+    # Simulate a replay changing speed (1x, 16x, pause, 4x, 1x) and compare against the old
+    # nudge heuristic of RunImageRecognition.detect_game_time, both seeing whole-second clock reads.
+    import datetime
+    from utils.game_clock import GameClock
+
+    class Legacy:
+        """The float/side heuristic as it was in r.py."""
+
+        def __init__(self):
+            self.interval = 1.0
+            self.float = 1.0
+            self.side = 0
+            self.history = [0, 0]
+
+        def update(self, elapsed: float) -> float:
+            if elapsed > 1 and self.interval > 0:
+                new_interval = (self.interval - self.float) if self.interval <= 2.0 else 0
+                if abs(sum(self.history)) == 0 and self.float > 0.001:
+                    self.float = abs(self.float / 2)
+                self.side -= 1
+                self.history.append(-1)
+                self.interval = max(0, new_interval)
+            elif elapsed < 2 and self.interval < 4:
+                new_interval = self.interval + self.float
+                if abs(sum(self.history)) == 0 and self.float > 0.001:
+                    self.float = abs(self.float / 2)
+                self.interval = min(4.0, new_interval)
+                self.side += 1
+                self.history.append(1)
+            if len(self.history) > 2:
+                self.history.pop(0)
+            if abs(self.side) == 3:
+                self.float = min(self.float * 10, 0.5)
+                self.side = 0
+            return self.interval
+
+    TICK_COST = 0.05  # wall seconds a tick takes, also the shortest possible interval
+    phases = [(1.0, 60.0), (16.0, 30.0), (0.0, 30.0), (4.0, 30.0), (1.0, 60.0)]
+
+    def simulate(name: str, legacy: bool):
+        controller = Legacy() if legacy else IntervalController(1.0)
+        clock = GameClock()
+        wall, game, last_read = 0.0, 600.0, 600
+        print(f"\n{name}")
+        print(f"{'speed':>6} {'ticks':>6} {'wasted':>7} {'game s/tick':>12} {'settled after':>14}")
+        total = 0
+        for speed, duration in phases:
+            end = wall + duration
+            ticks = wasted = 0
+            covered = []
+            settled = None
+            ideal = min(max(1.0 / speed, MIN_INTERVAL), MAX_INTERVAL) if speed else MAX_INTERVAL
+            while wall < end:
+                interval = max(controller.interval, TICK_COST)
+                wall += interval
+                game += speed * interval
+                read = int(game)
+                clock.observe(datetime.timedelta(seconds=read), wall)
+                if legacy:
+                    controller.update(read - last_read)
+                else:
+                    # what r.py feeds it: the speed of the clock model times the wall time the tick covered
+                    controller.update(clock.rate * interval, wall)
+                last_read = read
+                ticks += 1
+                covered.append(speed * interval)
+                # ticks that came sooner than half the ideal interval weren't needed
+                wasted += interval < ideal / 2
+                if settled is None and 0.8 <= controller.interval / ideal <= 1.25:
+                    settled = ticks
+            total += ticks
+            print(f"{speed:>5g}x {ticks:>6} {wasted:>7} {sum(covered) / len(covered):>12.2f} {str(settled) + ' ticks' if settled else 'never':>14}")
+        print(f"{total} captures")
+
+    simulate("legacy heuristic", True)
+    simulate("PI controller", False)
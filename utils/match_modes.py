@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from enum import Enum
+import numpy as np
+import cv2 as cv
+
+
+class MatchMode(Enum):
+    COLOR = "color"
+    GRAY = "gray"
+    BLUE = "blue"
+    GREEN = "green"
+    RED = "red"
+
+
+# channel index in a BGR(A) image, RGB images use 2 - index
+_CHANNELS = {MatchMode.BLUE: 0, MatchMode.GREEN: 1, MatchMode.RED: 2}
+
+
+def convert(image: np.ndarray, mode: MatchMode, order: str = "BGR") -> np.ndarray:
+    """
+    Convert an image in `order` ("BGR", "BGRA" or "RGB") into what `mode` matches on.
+    Only ever called on small crops and on templates once at load."""
+    if mode == MatchMode.COLOR:
+        if order == "BGR":
+            return image
+        return cv.cvtColor(image, cv.COLOR_BGRA2BGR if order == "BGRA" else cv.COLOR_RGB2BGR)
+    if mode == MatchMode.GRAY:
+        code = {"BGR": cv.COLOR_BGR2GRAY, "BGRA": cv.COLOR_BGRA2GRAY, "RGB": cv.COLOR_RGB2GRAY}[order]
+        return cv.cvtColor(image, code)
+    index = _CHANNELS[mode] if order != "RGB" else 2 - _CHANNELS[mode]
+    return np.ascontiguousarray(image[..., index])
+
+
+def parse_match_modes(value: str) -> dict[str, MatchMode]:
+    """
+    Parse --match_mode: either one mode for every timer ("gray"),
+    or per timer overrides ("color,roshan=gray,rune=red"). Keys are lowercase timer names."""
+    modes = {"default": MatchMode.COLOR}
+    for part in value.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        name, _, mode = part.rpartition("=")
+        modes[name or "default"] = MatchMode(mode)
+    return modes
+
+
+if __name__ == "__main__":
+    # Report how well each mode separates the shipped templates:
+    # every template is pasted into a noisy canvas, then all templates of the same group are matched against it.
+    # "pos" is the confidence of the right template, "neg" the best wrong one, "time" the cost on a full-size ROI.
+    import os
+    import sys
+    import time
+    from utils.screen_areas import area_events, area_items
+
+    groups = {
+        "images/bottle/normal": area_items,
+        "images/bottle/runes": area_items,
+        "images/roshan": area_events,
+        "images/tormentor": area_events,
+    }
+    screenshot = cv.imread(sys.argv[1], cv.IMREAD_COLOR) if len(sys.argv) > 1 else None
+    rng = np.random.default_rng(0)
+    for folder, area in groups.items():
+        templates = {f: cv.imread(os.path.join(folder, f), cv.IMREAD_COLOR) for f in sorted(os.listdir(folder))}
+        print(f"\n{folder} ({len(templates)} templates, ROI {area[2]}x{area[3]})")
+        print(f"{'mode':<6} {'min pos':>8} {'max neg':>8} {'margin':>8} {'time':>9}" + ("   screenshot best" if screenshot is not None else ""))
+        for mode in MatchMode:
+            positives, negatives = [], []
+            for name, template in templates.items():
+                h, w = template.shape[:2]
+                canvas = np.full((h * 2, w * 2, 3), template.mean(axis=(0, 1)), np.float32)
+                canvas[h // 2 : h // 2 + h, w // 2 : w // 2 + w] = template
+                canvas += rng.normal(0, 6, canvas.shape)
+                canvas = cv.GaussianBlur(np.clip(canvas, 0, 255).astype(np.uint8), (3, 3), 0)
+                canvas = convert(canvas, mode)
+                for other, other_template in templates.items():
+                    if other_template.shape[0] > canvas.shape[0] or other_template.shape[1] > canvas.shape[1]:
+                        continue
+                    conf = cv.minMaxLoc(cv.matchTemplate(canvas, convert(other_template, mode), cv.TM_CCOEFF_NORMED))[1]
+                    (positives if other == name else negatives).append(conf)
+            roi = convert(rng.integers(0, 255, (area[3], area[2], 3), np.uint8), mode)
+            cv.matchTemplate(roi, convert(next(iter(templates.values())), mode), cv.TM_CCOEFF_NORMED)  # warm up
+            start = time.perf_counter()
+            for template in templates.values():
+                cv.matchTemplate(roi, convert(template, mode), cv.TM_CCOEFF_NORMED)
+            elapsed = time.perf_counter() - start
+            max_negative = max(negatives) if negatives else 0.0
+            line = f"{mode.value:<6} {min(positives):8.3f} {max_negative:8.3f} {min(positives) - max_negative:8.3f} {elapsed * 1000:7.1f}ms"
+            if screenshot is not None:
+                x, y, w, h = area
+                crop = convert(screenshot[y : y + h, x : x + w], mode)
+                best = max(
+                    ((cv.minMaxLoc(cv.matchTemplate(crop, convert(t, mode), cv.TM_CCOEFF_NORMED))[1], n) for n, t in templates.items()),
+                )
+                line += f"   {best[0]:.3f} {best[1]}"
+            print(line)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from concurrent.futures import Future
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import threading
+import numpy as np
+from utils.ocr_cache import OCRCache
+from utils.settings import settings
+
+
+def _worker(conn, languages):
+    """OCR process: attaches to the parent's shared buffer and reads every crop of a batch."""
+    import easyocr
+
+    reader = easyocr.Reader(list(languages))
+    buffers = {}
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        name, crops, kwargs = message
+        if name not in buffers:
+            for old in buffers.values():
+                old.close()
+            buffers = {name: shared_memory.SharedMemory(name=name)}
+        buffer = buffers[name].buf
+        results = []
+        for offset, shape, dtype in crops:
+            image = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            results.append(reader.readtext(image, **kwargs))
+        conn.send(results)
+    for old in buffers.values():
+        old.close()
+
+
+class OCRService:
+    """
+    The one easyocr model everybody shares. The model is only loaded on first use.
+    With use_process the model lives in its own process: crops go through shared memory,
+    and requests that arrive while a batch is running are sent together as the next batch."""
+
+    def __init__(self, languages=("en",), use_process: bool = False):
+        self.languages = languages
+        self.use_process = use_process
+        self.batches = 0
+        self.requests = 0
+        self._reader = None
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._process = None
+        self._conn = None
+        self._shm = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._reader is not None or self._process is not None
+
+    def readtext(self, image: np.ndarray, **kwargs):
+        if not self.use_process:
+            with self._lock:
+                if self._reader is None:
+                    import easyocr
+
+                    self._reader = easyocr.Reader(list(self.languages))
+                self.requests += 1
+                self.batches += 1
+                return self._reader.readtext(image, **kwargs)
+        future = Future()
+        self._requests.put((np.ascontiguousarray(image), kwargs, future))
+        with self._lock:
+            if self._process is None:
+                self._start()
+        return future.result()
+
+    def _start(self):
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_worker, args=(child_conn, self.languages), daemon=True)
+        self._process.start()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def _buffer(self, size: int) -> shared_memory.SharedMemory:
+        if self._shm is None or self._shm.size < size:
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+            self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1 << 20))
+        return self._shm
+
+    def _dispatch(self):
+        while True:
+            pending = [self._requests.get()]
+            # everything that queued up meanwhile goes in the same batch
+            while True:
+                try:
+                    pending.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+            by_kwargs = dict()
+            for request in pending:
+                by_kwargs.setdefault(tuple(sorted(request[1].items())), []).append(request)
+            for kwargs, batch in by_kwargs.items():
+                try:
+                    shm = self._buffer(sum(image.nbytes for image, _, _ in batch))
+                    crops, offset = [], 0
+                    for image, _, _ in batch:
+                        np.ndarray(image.shape, image.dtype, shm.buf, offset)[...] = image
+                        crops.append((offset, image.shape, image.dtype.str))
+                        offset += image.nbytes
+                    self._conn.send((shm.name, crops, dict(kwargs)))
+                    results = self._conn.recv()
+                    self.batches += 1
+                    self.requests += len(batch)
+                    for (_, _, future), result in zip(batch, results):
+                        future.set_result(result)
+                except Exception as e:
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def close(self):
+        """Stop the worker and free the shared buffer, safe to call more than once."""
+        if self._process is not None:
+            try:
+                self._conn.send(None)
+            except OSError:
+                pass  # the worker is gone already
+            self._process.join(timeout=5)
+            self._process = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def summary(self) -> str:
+        where = "worker process" if self.use_process else "in process"
+        if not self.loaded:
+            return f"OCR ({where}): model not loaded yet"
+        return f"OCR ({where}): {self.requests} requests in {self.batches} batches"
+
+
+ocr_service = OCRService(use_process=settings.ocr_process)
+# everything reads through the cache, so repeated crops never reach the model
+ocr = OCRCache(ocr_service, settings.ocr_cache_size)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import hashlib
+import threading
+import numpy as np
+
+
+class OCRCache:
+    """
+    Bounded LRU cache in front of an easyocr reader, keyed by a hash of the crop's pixels and shape.
+    A paused game or a scrubbed replay shows the same crops over and over, those never hit the model twice."""
+
+    def __init__(self, reader, capacity: int = 256):
+        self.reader = reader
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, image: np.ndarray, kwargs: dict):
+        digest = hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16).digest()
+        return (image.shape, image.dtype.str, digest, tuple(sorted(kwargs.items())))
+
+    def readtext(self, image: np.ndarray, **kwargs):
+        if self.capacity <= 0:
+            return self.reader.readtext(image, **kwargs)
+        key = self.key(image, kwargs)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(self._entries[key])
+            self.misses += 1
+        result = self.reader.readtext(image, **kwargs)
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return list(result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def summary(self) -> str:
+        return f"OCR cache: {self.hits} hits, {self.misses} misses, {self.evictions} evictions ({len(self._entries)}/{self.capacity})"
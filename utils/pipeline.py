@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import time
+from typing import Optional
+import numpy as np
+from utils.capture import Frame, Rect, create_backend, merge_regions
+from utils.cooldown import Mode
+from utils.calibration import hud
+from utils.settings import settings
+
+SLOTS = 8
+RESULT_TIMEOUT = 1.0  # seconds between checks that the stages are still alive while waiting for a result
+
+
+class FrameRing:
+    """
+    A fixed layout of screen rectangles, `slots` frames of it in one shared memory block.
+    Frame `seq` goes to slot seq % slots, the slot's sequence number is -1 while it is being written.
+    Readers check the sequence number before and after using a slot, a changed number means
+    the capture process lapped them and whatever they computed from it is thrown away."""
+
+    def __init__(self, layout: list[Rect], screen: tuple[int, int], order: str, slots: int = SLOTS, name: str = None):
+        self.layout = layout
+        self.screen = screen
+        self.order = order
+        self.slots = slots
+        channels = len(order)
+        self.shapes = [(h, w, channels) for _, _, w, h in layout]
+        self.frame_size = sum(int(np.prod(shape)) for shape in self.shapes)
+        header = slots * 8
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=header + slots * max(self.frame_size, 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.seqs = np.ndarray((slots,), np.int64, self.shm.buf)
+        if name is None:
+            self.seqs[:] = -1
+        self.frames = []
+        for slot in range(slots):
+            offset = header + slot * self.frame_size
+            patches = []
+            for rect, shape in zip(layout, self.shapes):
+                patches.append((rect, np.ndarray(shape, np.uint8, self.shm.buf, offset)))
+                offset += int(np.prod(shape))
+            self.frames.append(Frame(patches, screen, order))
+
+    def spec(self) -> tuple:
+        """What a process needs to attach to this ring."""
+        return (self.layout, self.screen, self.order, self.slots, self.shm.name)
+
+    @classmethod
+    def attach(cls, spec: tuple) -> FrameRing:
+        layout, screen, order, slots, name = spec
+        return cls(layout, screen, order, slots, name)
+
+    def write(self, seq: int, frame: Frame, regions: list[Rect]):
+        """Copy the regions of a grabbed frame into the slot of `seq`."""
+        slot = seq % self.slots
+        self.seqs[slot] = -1
+        target = self.frames[slot]
+        for rect in regions:
+            source = frame.pixels(rect)
+            if source is not None:
+                target.pixels(rect)[...] = source
+        self.seqs[slot] = seq
+
+    def read(self, seq: int) -> Optional[Frame]:
+        """The frame in shared memory (no copy), None if the slot was overwritten already."""
+        return self.frames[seq % self.slots] if self.valid(seq) else None
+
+    def valid(self, seq: int) -> bool:
+        return int(self.seqs[seq % self.slots]) == seq
+
+    def close(self, unlink: bool = False):
+        """Only for the owner, the stages keep their mapping until the process exits (frames may still point into it)."""
+        self.frames = []
+        self.seqs = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _latest(inlet) -> tuple[Optional[tuple], int]:
+    """Newest message of a queue and how many older ones were skipped, stages never work on stale frames."""
+    message = inlet.get()
+    skipped = 0
+    while message is not None:
+        try:
+            newer = inlet.get_nowait()
+        except queue.Empty:
+            break
+        if newer is None:
+            return None, skipped
+        # frames dropped further up the pipeline stay counted
+        skipped += 1 + (message["dropped"] if isinstance(message, dict) else 0)
+        message = newer
+    return message, skipped
+
+
+def _capture_main(spec: tuple, backend_name: str, clock: Rect, regions: dict[str, Rect], requests, outlet):
+    """Capture process: grabs the clock and the requested timers' regions into the next ring slot."""
+    ring = FrameRing.attach(spec)
+    capture = create_backend(backend_name)
+    seq = 0
+    while True:
+        request, _ = _latest(requests)
+        if request is None:
+            break
+        mode, labels = request
+        rects = [clock] + [regions[label] for label in labels if label in regions]
+        start = time.time()
+        frame = capture.grab(rects)
+        ring.write(seq, frame, rects)
+        outlet.put({"seq": seq, "wall": start, "mode": mode, "labels": labels, "area": frame.area(), "capture": time.time() - start, "dropped": 0})
+        seq += 1
+    outlet.put(None)
+
+
+def _ocr_main(spec: tuple, clock: Rect, inlet, outlet):
+    """OCR process: reads the clock of the newest frame and passes the frame on to the matching process."""
+    from utils.change_detector import region_changes
+    from utils.clock_reader import ClockReader, read_clock
+    from utils.ocr import ocr, ocr_service
+
+    ocr_service.use_process = False  # we are the OCR process, and daemons can't have children
+    ring = FrameRing.attach(spec)
+    digits = ClockReader() if settings.clock_reader else None
+    last = None
+    lost = 0  # lapped frames, reported with the next frame that makes it through
+    while True:
+        message, skipped = _latest(inlet)
+        if message is None:
+            break
+        start = time.time()
+        message["dropped"] += skipped + lost
+        lost = 0
+        frame = ring.read(message["seq"])
+        screenshot = frame.crop(*clock) if frame is not None else None
+        if screenshot is None or not ring.valid(message["seq"]):
+            lost = message["dropped"] + 1
+            continue
+        if region_changes.changed("Clock", screenshot) or last is None:
+            last = read_clock(screenshot, digits, ocr)
+        message["clock"], message["clock_source"] = last
+        message["ocr"] = time.time() - start
+        outlet.put(message)
+    outlet.put(None)
+
+
+async def _detect(timers: dict, labels: dict[str, list], frame: Frame) -> dict:
+    async def detect(timer):
+        timer.active_images = labels[timer.label]
+        found, outputs = await timer.detect_image(frame)
+        return timer.label, (found, outputs, timer.detected_image_name, timer.searched_area)
+
+    jobs = [detect(timers[label]) for label in labels if label in timers and frame.contains(timers[label].search_region)]
+    return dict(await asyncio.gather(*jobs))
+
+
+def _match_main(spec: tuple, factories: list[tuple[type, str]], regions: dict[str, Rect], inlet, outlet):
+    """Matching process: its own copy of every timer does the template matching, only the decisions go back."""
+    from utils.ocr import ocr_service
+
+    ocr_service.use_process = False  # tormentor's OCR fallback, daemons can't have children
+    ring = FrameRing.attach(spec)
+    timers = {}
+    for factory, label in factories:
+        timer = factory(label)
+        timer.disabled = False  # the UI process decides what runs, through the labels of a request
+        timer.search_area(*regions[label])  # same (calibrated) regions as the UI process
+        timers[label] = timer
+    loop = asyncio.new_event_loop()
+    while True:
+        message, skipped = _latest(inlet)
+        if message is None:
+            break
+        start = time.time()
+        message["dropped"] += skipped
+        settings.cooldowns.mode = Mode(message["mode"])
+        frame = ring.read(message["seq"])
+        detections = loop.run_until_complete(_detect(timers, message["labels"], frame)) if frame is not None else {}
+        if not ring.valid(message["seq"]):
+            # lapped by the capture process while matching, the pixels changed under us
+            message["dropped"] += 1
+            detections = {}
+        message["detections"] = detections
+        message["match"] = time.time() - start
+        outlet.put(message)
+    outlet.put(None)
+    loop.close()
+
+
+class Pipeline:
+    """
+    Capture, clock OCR and template matching in three processes, so they run on separate cores
+    and work on consecutive frames at the same time. Frames only ever live in the shared memory ring,
+    the queues carry sequence numbers and small dicts of results.
+    The UI process asks for frames with request() and gets one result dict per processed frame from result()."""
+
+    def __init__(self, timers: list, backend_name: str = "auto", slots: int = SLOTS):
+        backend = create_backend(backend_name)
+        self.backend = backend.name
+        regions = {timer.label: timer.search_region for timer in timers}
+        clock = hud.area_time
+        self.ring = FrameRing(merge_regions([clock, *regions.values()], backend.screen), backend.screen, backend.order, slots)
+        context = multiprocessing.get_context("spawn")  # same as on windows, and no forking of a process with threads
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        # kept for the life of the pipeline: Process.start() drops its args, and a queue collected in the parent
+        # unlinks its semaphores before the spawned children got to unpickle them
+        self.frames, self.clocks = context.Queue(), context.Queue()
+        spec = self.ring.spec()
+        factories = [(type(timer), timer.label) for timer in timers]
+        self.processes = [
+            context.Process(target=_capture_main, args=(spec, backend_name, clock, regions, self.requests, self.frames), name="pipeline-capture", daemon=True),
+            context.Process(target=_ocr_main, args=(spec, clock, self.frames, self.clocks), name="pipeline-ocr", daemon=True),
+            context.Process(target=_match_main, args=(spec, factories, regions, self.clocks, self.results), name="pipeline-match", daemon=True),
+        ]
+        self.requested = 0
+        self.received = 0
+        self.dropped = 0
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def request(self, labels: dict[str, list]):
+        """Grab a new frame, the timers with these labels get matched on it (only against the listed templates)."""
+        self.requests.put((settings.cooldowns.currentMode().value, labels))
+        self.requested += 1
+
+    def result(self) -> Optional[dict]:
+        """Blocks until the next frame is through the pipeline, None once it was closed. Raises if a stage died."""
+        while True:
+            try:
+                message = self.results.get(timeout=RESULT_TIMEOUT)
+                break
+            except queue.Empty:
+                dead = [f"{process.name} (exit code {process.exitcode})" for process in self.processes if not process.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Pipeline stage died: {', '.join(dead)}")
+        if message is not None:
+            self.received += 1
+            self.dropped += message["dropped"]
+        return message
+
+    def close(self):
+        self.requests.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                # a stage further up died, the end of the stream never reaches this one
+                process.terminate()
+        self.ring.close(unlink=True)
+
+    def summary(self) -> str:
+        return f"Pipeline ({self.ring.slots} slots): {self.requested} frames requested, {self.received} processed, {self.dropped} dropped"
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import time
+from typing import Optional
+import numpy as np
+import cv2 as cv
+from utils.calibration import hud
+from utils.capture import Frame, Rect
+
+RING_PAD = 0.5  # of the clock's height, the hud frame around the clock
+GRID = (16, 6)  # cells of the signature, the inner ones (the digits) are left out
+RING = np.ones(GRID[::-1], bool)
+RING[1:-1, 2:-2] = False
+THRESHOLD = 12.0  # mean difference per cell (0-255) that counts as another picture
+PROBE_INTERVAL = 0.5  # seconds between probes while sleeping, with a backend that grabs regions (mss)
+FIRST_CHECK = 1.0  # seconds until the first full clock read after going to sleep, doubles every time
+LONGEST_CHECK = 30.0
+
+
+class PresenceProbe:
+    """
+    Is a game on screen? Answered without OCR by a tiny signature of the hud frame around the clock
+    (the digits change every second, the frame doesn't), a few dozen averaged cells.
+    While no game is visible the detection thread sleeps: it only probes that ring, and reads the clock
+    with backoff (1s, 2s, 4s, ... 30s) in case the signature is fooled. It wakes right away when the ring settles
+    on something new, or on what it looked like the last time a game was seen.
+    The probe is only cheap when the capture backend grabs regions (mss). pyautogui takes the whole desktop
+    every time, with it the detection thread only wakes up for the backoff clock reads."""
+
+    def __init__(self, threshold: float = THRESHOLD, first: float = FIRST_CHECK, longest: float = LONGEST_CHECK):
+        self.threshold = threshold
+        self.first = first
+        self.longest = longest
+        self.sleeping = False
+        self.backoff = first
+        self.next_check = 0.0
+        self.last = None  # signature of the last probe
+        self.asleep = None  # signature when we went to sleep
+        self.game = None  # signature of the ring while a game was on screen
+        self.probes = 0
+        self.wakes = 0
+
+    def ring(self) -> Rect:
+        x, y, w, h = hud.area_time
+        pad = max(2, int(h * RING_PAD))
+        return (max(0, x - 2 * pad), max(0, y - pad), w + 4 * pad, h + 2 * pad)
+
+    def signature(self, frame: Frame) -> Optional[np.ndarray]:
+        ring = self.ring()
+        if not frame.contains(ring):
+            return None
+        # the digits are in the middle, only the frame around them counts
+        return cv.resize(frame.crop(*ring), GRID, interpolation=cv.INTER_AREA)[RING].astype(np.float32)
+
+    def distance(self, a: Optional[np.ndarray], b: Optional[np.ndarray]) -> float:
+        if a is None or b is None or a.shape != b.shape:
+            return float("inf")
+        return float(np.abs(a - b).mean())
+
+    def probe(self, frame: Frame) -> Optional[np.ndarray]:
+        signature = self.signature(frame)
+        self.last, previous = signature, self.last
+        self.probes += 1
+        return previous
+
+    def seen(self):
+        """A clock was read: a game is on screen, remember what the ring looks like."""
+        if self.last is not None:
+            self.game = self.last if self.game is None else self.game + 0.2 * (self.last - self.game)
+        self.sleeping = False
+        self.backoff = self.first
+
+    def absent(self):
+        """No game on screen: sleep, and wait twice as long as last time for the next full check."""
+        if not self.sleeping:
+            self.backoff = self.first
+        else:
+            self.backoff = min(self.backoff * 2, self.longest)
+        self.sleeping = True
+        self.asleep = self.last
+        self.next_check = time.time() + self.backoff
+
+    def wake(self, frame: Frame) -> bool:
+        """Probe a frame with the ring in it. True if detection should run (awake, a flip, or a check is due)."""
+        previous = self.probe(frame)
+        if not self.sleeping:
+            return True
+        # the hud we saw before wakes us right away, anything else new only once it holds still for two probes
+        # (an animated menu would wake us all the time)
+        settled = self.distance(self.last, previous) <= self.threshold
+        flipped = self.distance(self.last, self.game) <= self.threshold or (settled and self.distance(self.last, self.asleep) > self.threshold)
+        if flipped or time.time() >= self.next_check:
+            self.wakes += flipped
+            return True
+        return False
+
+    def summary(self) -> str:
+        if not self.sleeping:
+            return f"Presence: game on screen, {self.probes} probes"
+        return f"Presence: sleeping, next clock read in {max(0.0, self.next_check - time.time()):.1f}s (backoff {self.backoff:g}s), woken {self.wakes} times by the probe"
+
+
+presence = PresenceProbe()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from utils.settings import settings
+
+MAX_STALENESS = 10.0  # a detector this many periods late can outrank anything
+
+
+class Scheduler:
+    """
+    Decides which detectors run on a tick. Every detector has its own cadence (seconds of game time between runs,
+    so a paused game costs nothing) and a priority. Detectors that are due are picked by priority times staleness
+    until the estimated cost (moving average of what they took before) would overrun the tick budget,
+    the rest waits for the next tick. At least one detector always runs, so nothing starves.
+    The detectors of a tick run side by side on the match pool, so the budget is for the busiest worker,
+    not the sum of all costs."""
+
+    def __init__(self, budget: float, workers: int = 1, smoothing: float = 0.3):
+        self.budget = budget  # seconds per tick, 0 is unlimited
+        self.workers = max(1, workers)  # 0 workers still is one lane, the detection thread
+        self.smoothing = smoothing
+        self.last_run = {}  # name -> time of the last run
+        self.cost = {}  # name -> moving average of the seconds it took
+        self.cadence = {}
+        self.deferred = set()  # due but left out by the budget on the last plan
+
+    def staleness(self, name: str, cadence: float, now: float) -> float:
+        """How many periods since the last run, >= 1 is due."""
+        self.cadence[name] = cadence
+        last = self.last_run.get(name)
+        # never ran, or the game time went back (replay)
+        if last is None or now < last or cadence <= 0:
+            return MAX_STALENESS
+        return min((now - last) / cadence, MAX_STALENESS)
+
+    def due(self, name: str, cadence: float, now: float) -> bool:
+        return self.staleness(name, cadence, now) >= 1
+
+    def plan(self, detectors: list, now: float) -> list:
+        """Detectors (with label, cadence and priority) to run now, most urgent first. They count as run from here on."""
+        due = [detector for detector in detectors if self.due(detector.label, detector.cadence, now)]
+        due.sort(key=lambda detector: detector.priority * self.staleness(detector.label, detector.cadence, now), reverse=True)
+        planned, lanes = [], [0.0] * self.workers
+        self.deferred = set()
+        for detector in due:
+            cost = self.cost.get(detector.label, 0.0)
+            # the next job goes to whichever worker is done first
+            lane = lanes.index(min(lanes))
+            if planned and self.budget > 0 and lanes[lane] + cost > self.budget:
+                self.deferred.add(detector.label)
+                continue
+            planned.append(detector)
+            lanes[lane] += cost
+        for detector in planned:
+            self.mark(detector.label, now)
+        return planned
+
+    def mark(self, name: str, now: float):
+        self.last_run[name] = now
+
+    def ran(self, name: str, seconds: float):
+        """What a run took, when the result is in."""
+        previous = self.cost.get(name)
+        self.cost[name] = seconds if previous is None else previous + self.smoothing * (seconds - previous)
+
+    def lag(self, name: str, now: float) -> float:
+        """How much later than its cadence a detector is running (0 is on time)."""
+        last = self.last_run.get(name)
+        if last is None or now < last:
+            return 0.0
+        return max(0.0, now - last - self.cadence.get(name, 0.0))
+
+    def summary(self, now: float) -> list[str]:
+        lines = []
+        for name in sorted(self.cadence):
+            deferred = ", deferred" if name in self.deferred else ""
+            lines.append(f"{name}: every {self.cadence[name]:g}s, lag {self.lag(name, now):.1f}s, ~{self.cost.get(name, 0.0) * 1000:.0f}ms{deferred}")
+        return lines
+
+
+scheduler = Scheduler(settings.tick_budget_ms / 1000, settings.workers)
@@ -1,5 +1,7 @@
 import argparse
+import os
 from utils.cooldown import Mode, Respawn_Duration
+from utils.match_modes import MatchMode, parse_match_modes
 
 
 class Settings:
@@ -9,9 +11,29 @@ class Settings:
         self.show_confidence = args.show_confidence
         self.image_detection_interval: float = args.image_detection_interval
         self.refresh_interval_curses = args.refresh_interval_curses
+        self.max_fps = args.max_fps
         self.use_real_time = args.use_real_time
         self.history_window = None
         self.rune_timer = not args.no_rune_timer
+        self.capture_backend = args.capture_backend
+        self.change_threshold = args.change_threshold
+        self.match_modes = parse_match_modes(args.match_mode)
+        self.clock_reader = not args.no_clock_reader
+        self.ocr_cache_size = args.ocr_cache_size
+        self.clock_confirm_interval = args.clock_confirm_interval
+        self.ocr_process = args.ocr_process
+        self.matching = args.matching
+        self.pyramid_levels = args.pyramid_levels
+        self.workers = args.workers
+        self.pipeline = args.pipeline
+        self.full_scan = args.full_scan
+        self.prior_refresh = args.prior_refresh
+        self.template_scale = args.template_scale
+        self.tick_budget_ms = args.tick_budget_ms
+        self.samples_per_game_second = args.samples_per_game_second
+
+    def match_mode_for(self, timer_name: str) -> MatchMode:
+        return self.match_modes.get(timer_name.lower(), self.match_modes["default"])
 
 parser = argparse.ArgumentParser(description="Dota 2 Timer")
 parser.add_argument("--turbo", action="store_true", help="Turbo mode", default=False)
@@ -35,9 +57,15 @@ parser.add_argument(
 parser.add_argument(
     "--refresh_interval_curses",
     type=int,
-    help="Refresh interval for the frontend (ms)",
+    help="Longest the frontend waits for a key before it looks for changes to draw (ms)",
     default=100,
 )
+parser.add_argument(
+    "--max_fps",
+    type=float,
+    help="Most frames a second the frontend draws, it only redraws on keys, resizes, detection results and clock seconds (0 is uncapped)",
+    default=30.0,
+)
 parser.add_argument(
     "--use_real_time",
     action="store_true",
@@ -52,6 +80,102 @@ parser.add_argument(
     default=False,
 )
 
+parser.add_argument(
+    "--capture_backend",
+    choices=["auto", "mss", "pyautogui"],
+    help="How to grab the screen: mss grabs only the searched regions, pyautogui takes a full screenshot",
+    default="auto",
+)
+parser.add_argument(
+    "--change_threshold",
+    type=float,
+    help="Max pixel difference (0-255, on a 4x downsampled region) to treat a region as unchanged and reuse the last results, negative disables",
+    default=8.0,
+)
+parser.add_argument(
+    "--match_mode",
+    help="Channels used for template matching: color, gray, blue, green or red. Per timer: color,roshan=gray,rune=red (see python -m utils.match_modes)",
+    default="color",
+)
+parser.add_argument(
+    "--no_clock_reader",
+    action="store_true",
+    help="Always read the game clock with easyocr instead of the learned digit templates",
+    default=False,
+)
+parser.add_argument(
+    "--ocr_cache_size",
+    type=int,
+    help="How many OCR results to keep, keyed by the pixels of the crop (0 disables the cache)",
+    default=256,
+)
+parser.add_argument(
+    "--clock_confirm_interval",
+    type=float,
+    help="Once the clock model is locked, only read the clock every this many seconds and extrapolate in between (0 reads every tick)",
+    default=1.0,
+)
+parser.add_argument(
+    "--ocr_process",
+    action="store_true",
+    help="Run easyocr in its own process (crops are passed through shared memory)",
+    default=False,
+)
+parser.add_argument(
+    "--matching",
+    choices=["auto", "loop", "batched"],
+    help="Template matching engine: one matchTemplate per template, or all templates of a timer sharing the ROI's DFT (see python -m utils.template_matching)",
+    default="auto",
+)
+parser.add_argument(
+    "--pyramid_levels",
+    type=int,
+    help="Roshan/tormentor search the kill feed downscaled by 2^levels first, then refine at full resolution (0 searches at full resolution only)",
+    default=0,
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    help="Threads for template matching and OCR (0 runs everything on the detection thread)",
+    default=min(4, os.cpu_count() or 1),
+)
+parser.add_argument(
+    "--full_scan",
+    action="store_true",
+    help="Match every template on every tick, instead of stopping at the first decisive match (always on in debug mode)",
+    default=False,
+)
+parser.add_argument(
+    "--prior_refresh",
+    type=int,
+    help="Search a timer's whole region at least every this many ticks, in between only around where its templates last matched (0 always searches the whole region)",
+    default=10,
+)
+parser.add_argument(
+    "--template_scale",
+    type=float,
+    help="Scale the templates by this much (other resolution / hud scale). 0 probes it once per resolution, see python -m utils.calibration",
+    default=0.0,
+)
+parser.add_argument(
+    "--tick_budget_ms",
+    type=float,
+    help="Wall time a detection tick may take with the detectors spread over --workers, detectors that don't fit wait for the next tick by priority and staleness (0 is unlimited, a full roshan search alone can take ~70ms at 1440p)",
+    default=0.0,
+)
+parser.add_argument(
+    "--pipeline",
+    action="store_true",
+    help="Capture, read the clock and match templates in three separate processes that share frames through shared memory",
+    default=False,
+)
+parser.add_argument(
+    "--samples_per_game_second",
+    type=float,
+    help="How many detection ticks per second of game time, the interval between ticks follows the replay speed (see python -m utils.interval_controller)",
+    default=1.0,
+)
+
 
 args = parser.parse_args()
 settings = Settings(args)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import os
+from typing import Optional
+import numpy as np
+import cv2 as cv
+
+PROFILE_WIDTH = 160  # covers "The Radiant" and the sword icon after it
+TEXT_THRESHOLD = 180
+
+
+def _side(image_name: str) -> str:
+    return "Dire Tormentor" if "dire" in os.path.basename(image_name).lower() else "Radiant Tormentor"
+
+
+def _gray(image: np.ndarray) -> np.ndarray:
+    return image if image.ndim == 2 else cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+
+
+def text_profile(image: np.ndarray) -> np.ndarray:
+    """How much white text every column of the banner has. "The Dire" ends ~40px before "The Radiant" does."""
+    profile = (_gray(image) > TEXT_THRESHOLD).mean(axis=0)[:PROFILE_WIDTH].astype(np.float32)
+    profile = np.pad(profile, (0, PROFILE_WIDTH - len(profile)))
+    profile -= profile.mean()
+    norm = np.linalg.norm(profile)
+    return profile / norm if norm else profile
+
+
+def banner_histogram(image: np.ndarray) -> Optional[np.ndarray]:
+    """Hue histogram of the banner without the text, green for allies and red for enemies."""
+    if image.ndim != 3:
+        return None
+    hsv = cv.cvtColor(image, cv.COLOR_BGR2HSV)
+    mask = (_gray(image) <= TEXT_THRESHOLD).astype(np.uint8)
+    histogram = cv.calcHist([hsv], [0], mask, [18], [0, 180])
+    return cv.normalize(histogram, histogram).ravel()
+
+
+class SideClassifier:
+    """
+    Tells which side's tormentor died from the kill feed banner without OCR:
+    the side of the template that matched has to agree with the text profile of the crop.
+    The banner colors pick which (ally/enemy) templates to compare the profile with."""
+
+    def __init__(self, templates: dict[str, np.ndarray], min_margin: float = 0.15):
+        self.min_margin = min_margin
+        self.signatures = [
+            (_side(name), text_profile(template), banner_histogram(template)) for name, template in templates.items()
+        ]
+
+    def classify(self, crop: np.ndarray, matched_image: str) -> tuple[Optional[str], float]:
+        """Returns (side, margin), side is None when the classifier isn't sure and OCR should decide."""
+        profile = text_profile(crop)
+        histogram = banner_histogram(crop)
+        candidates = self.signatures
+        if histogram is not None:
+            # only compare with the templates whose banner color is closest (same ally/enemy banner)
+            color_scores = [cv.compareHist(histogram, h, cv.HISTCMP_CORREL) for _, _, h in self.signatures]
+            best_color = max(color_scores)
+            candidates = [s for s, score in zip(self.signatures, color_scores) if score >= best_color - 0.1]
+            if len({side for side, _, _ in candidates}) < 2:
+                candidates = self.signatures
+        scores = {}
+        for side, template_profile, _ in candidates:
+            scores[side] = max(scores.get(side, -1.0), float(profile @ template_profile))
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        side, best = ranked[0]
+        margin = best - ranked[1][1] if len(ranked) > 1 else best
+        if side != _side(matched_image) or margin < self.min_margin:
+            return None, margin
+        return side, margin
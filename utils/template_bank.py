@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import cv2 as cv
+from utils.calibration import hud
+from utils.match_modes import MatchMode, convert
+
+BANK_VERSION = 2
+PYRAMID_LEVELS = (1, 2)
+
+
+def _key(path: str) -> str:
+    return path.replace("\\", "/")
+
+
+class TemplateBank:
+    """
+    Every template under images/ plus its derived forms (match modes, pyramid levels), compiled into one
+    flat .npy that is memory-mapped at startup. All timers get views into the same arrays.
+    The file name carries a hash of the sources, so editing or adding a png rebuilds the bank on the next launch.
+    With a scale other than 1 every png is resized first (other resolutions / hud scales), each scale is its own file."""
+
+    def __init__(self, source_dir: str = "images", cache_dir: str = "cache", scale: float = 1.0):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.scale = scale
+        self.entries = {}  # (path, mode, level) -> array view
+        self.built = False  # True if the bank had to be compiled this launch
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._native = None
+
+    def sources(self) -> dict[str, str]:
+        """path -> content hash of every png under the source dir."""
+        hashes = {}
+        for root, _, files in os.walk(self.source_dir):
+            for name in sorted(files):
+                if name.lower().endswith(".png"):
+                    path = _key(os.path.join(root, name))
+                    with open(path, "rb") as f:
+                        hashes[path] = hashlib.sha1(f.read()).hexdigest()
+        return dict(sorted(hashes.items()))
+
+    def _prefix(self) -> str:
+        return f"templates-v{BANK_VERSION}-x{self.scale:g}-"
+
+    def _paths(self, sources: dict[str, str]) -> tuple[str, str]:
+        digest = hashlib.sha1(json.dumps([BANK_VERSION, self.scale, sources]).encode()).hexdigest()[:16]
+        base = os.path.join(self.cache_dir, self._prefix() + digest)
+        return base + ".npy", base + ".json"
+
+    def compile(self, sources: dict[str, str]) -> tuple[np.ndarray, dict]:
+        """Decode every png once and derive everything the matchers use."""
+        arrays, index, offset = [], {}, 0
+        for path in sources:
+            color = cv.imread(path, cv.IMREAD_COLOR)
+            if self.scale != 1:
+                h, w = color.shape[:2]
+                size = (max(1, round(w * self.scale)), max(1, round(h * self.scale)))
+                color = cv.resize(color, size, interpolation=cv.INTER_AREA if self.scale < 1 else cv.INTER_CUBIC)
+            for mode in MatchMode:
+                converted = convert(color, mode)
+                forms = [(0, converted)]
+                h, w = converted.shape[:2]
+                for level in PYRAMID_LEVELS:
+                    scale = 2**level
+                    if h // scale and w // scale:
+                        forms.append((level, cv.resize(converted, (w // scale, h // scale), interpolation=cv.INTER_AREA)))
+                for level, array in forms:
+                    array = np.ascontiguousarray(array, dtype=np.uint8)
+                    index[f"{path}|{mode.value}|{level}"] = (offset, list(array.shape))
+                    arrays.append(array.ravel())
+                    offset += array.size
+        return np.concatenate(arrays), index
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            sources = self.sources()
+            data_path, index_path = self._paths(sources)
+            try:
+                data = np.load(data_path, mmap_mode="r")
+                with open(index_path) as f:
+                    index = json.load(f)["entries"]
+            except (OSError, ValueError, KeyError):
+                data, index = self.compile(sources)
+                self.built = True
+                try:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    self._remove_stale()
+                    np.save(data_path, data)
+                    with open(index_path, "w") as f:
+                        json.dump({"version": BANK_VERSION, "scale": self.scale, "sources": sources, "entries": index}, f)
+                    data = np.load(data_path, mmap_mode="r")
+                except OSError:
+                    pass  # can't write the cache, keep the bank we just built in memory
+            for name, (offset, shape) in index.items():
+                path, mode, level = name.split("|")
+                self.entries[(path, MatchMode(mode), int(level))] = data[offset : offset + int(np.prod(shape))].reshape(shape)
+            self._loaded = True
+
+    def _remove_stale(self):
+        """Older builds of this scale and everything of older versions, other scales can still be used."""
+        current = f"templates-v{BANK_VERSION}-"
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("templates-v") and (not name.startswith(current) or name.startswith(self._prefix())):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def rescale(self, scale: float):
+        """Switch to the bank of another scale (built on first use), views handed out before stay valid."""
+        with self._lock:
+            if scale == self.scale:
+                return
+            self.scale = scale
+            self.entries = {}
+            self.built = False
+            self._loaded = False
+
+    def native(self) -> TemplateBank:
+        """The templates as captured (scale 1)."""
+        if self.scale == 1:
+            return self
+        if self._native is None:
+            self._native = TemplateBank(self.source_dir, self.cache_dir)
+        return self._native
+
+    def get(self, path: str, mode: MatchMode = MatchMode.COLOR, level: int = 0) -> np.ndarray:
+        self.load()
+        return self.entries[(_key(path), mode, level)]
+
+    def images_in(self, folder: str) -> list[str]:
+        """The pngs of a folder, as os.path.join(folder, name) like os.listdir would give them."""
+        self.load()
+        prefix = _key(folder).rstrip("/") + "/"
+        names = sorted({path[len(prefix) :] for path, _, _ in self.entries if path.startswith(prefix) and "/" not in path[len(prefix) :]})
+        return [os.path.join(folder, name) for name in names]
+
+    def nbytes(self) -> int:
+        self.load()
+        return sum(array.nbytes for array in self.entries.values())
+
+
+# scale of this screen, as probed before (or guessed from the resolution)
+template_bank = TemplateBank(scale=hud.scale)
+
+
+if __name__ == "__main__":
+    # build step: compile the bank (again) and show what's in it
+    import sys
+    import time
+
+    start = time.perf_counter()
+    bank = TemplateBank(scale=template_bank.scale)
+    if "--rebuild" in sys.argv and os.path.isdir(bank.cache_dir):
+        bank._remove_stale()
+    bank.load()
+    print(f"{'built' if bank.built else 'loaded'} {len(bank.entries)} templates at scale {bank.scale:g} ({bank.nbytes() / 1024:.0f} KiB) in {(time.perf_counter() - start) * 1000:.1f}ms")
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import time
+import numpy as np
+import cv2 as cv
+
+
+def _channels(image: np.ndarray) -> list[np.ndarray]:
+    image = image.astype(np.float32)
+    return [image] if image.ndim == 2 else list(cv.split(image))
+
+
+def _window_sums(integral: np.ndarray, h: int, w: int) -> np.ndarray:
+    """Sum of every h x w window, from an integral image."""
+    return integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+
+
+class TemplateSet:
+    """
+    Matches a whole set of templates against one ROI (TM_CCOEFF_NORMED, same numbers as cv.matchTemplate).
+    Per ROI the DFT of every channel and the integral images are computed once and shared,
+    per template there is one spectrum product per channel and a single inverse DFT.
+    Window statistics are shared between templates of the same size."""
+
+    def __init__(self, templates: dict[str, np.ndarray]):
+        self.templates = templates
+        self._prepared_for = None
+        self._spectra = {}  # image -> (per channel spectra of the zero mean template, template norm)
+
+    def _prepare(self, shape):
+        """Template spectra depend on the DFT size, which depends on the ROI size (fixed per timer)."""
+        self._prepared_for = shape
+        self._dft_size = (cv.getOptimalDFTSize(shape[0]), cv.getOptimalDFTSize(shape[1]))
+        self._spectra = {}
+        for image, template in self.templates.items():
+            channels = _channels(template)
+            zero_mean = [channel - channel.mean() for channel in channels]
+            norm = float(sum((channel * channel).sum() for channel in zero_mean))
+            spectra = []
+            for channel in zero_mean:
+                padded = np.zeros(self._dft_size, np.float32)
+                padded[: channel.shape[0], : channel.shape[1]] = channel
+                spectra.append(cv.dft(padded))
+            self._spectra[image] = (spectra, norm)
+
+    def match(self, roi: np.ndarray, order: list[str] = None, stop_at: float = None) -> dict[str, tuple[float, tuple[int, int], float]]:
+        """
+        Returns {image: (max confidence, max location, seconds)}, the shared work is split evenly over the templates.
+        Templates are tried in `order` (default all), with stop_at the first one reaching that confidence ends the search."""
+        start = time.time()
+        if self._prepared_for != roi.shape:
+            self._prepare(roi.shape)
+        H, W = roi.shape[:2]
+        channels = _channels(roi)
+        image_spectra = []
+        integrals = []
+        for channel in channels:
+            padded = np.zeros(self._dft_size, np.float32)
+            padded[:H, :W] = channel
+            image_spectra.append(cv.dft(padded))
+            integrals.append(cv.integral2(channel, sdepth=cv.CV_64F, sqdepth=cv.CV_64F))
+        shared = time.time() - start
+
+        window_variance = {}  # (h, w) -> sum over channels of the windows' sum of squared deviations
+        results = {}
+        for image in order or self.templates:
+            template_spectra, template_norm = self._spectra[image]
+            template_start = time.time()
+            h, w = self.templates[image].shape[:2]
+            if h > H or w > W:
+                results[image] = (0.0, (0, 0), 0.0)
+                continue
+            if (h, w) not in window_variance:
+                variance = np.zeros((H - h + 1, W - w + 1))
+                for sums, squares in integrals:
+                    s = _window_sums(sums, h, w)
+                    variance += _window_sums(squares, h, w) - s * s / (h * w)
+                window_variance[(h, w)] = np.maximum(variance, 0)
+            spectrum = None
+            for image_spectrum, template_spectrum in zip(image_spectra, template_spectra):
+                product = cv.mulSpectrums(image_spectrum, template_spectrum, 0, conjB=True)
+                spectrum = product if spectrum is None else spectrum + product
+            numerator = cv.dft(spectrum, flags=cv.DFT_INVERSE | cv.DFT_SCALE | cv.DFT_REAL_OUTPUT)[: H - h + 1, : W - w + 1]
+            denominator = np.sqrt(window_variance[(h, w)] * template_norm)
+            # same handling of flat windows as opencv
+            with np.errstate(divide="ignore", invalid="ignore"):
+                result = np.where(
+                    np.abs(numerator) < denominator,
+                    numerator / denominator,
+                    np.where(np.abs(numerator) < denominator * 1.125, np.sign(numerator), 0),
+                ).astype(np.float32)
+            _, max_conf, _, max_loc = cv.minMaxLoc(result)
+            results[image] = (max_conf, max_loc, time.time() - template_start)
+            if stop_at is not None and max_conf >= stop_at:
+                break
+        per_template = shared / max(len(results), 1)
+        return {image: (conf, loc, seconds + per_template) for image, (conf, loc, seconds) in results.items()}
+
+
+class TemplatePyramid:
+    """
+    Coarse-to-fine search: match downscaled templates against a downscaled ROI,
+    then re-run the full resolution match only in small windows around the best coarse candidates.
+    The downscaled templates are made once, at load."""
+
+    def __init__(self, templates: dict[str, np.ndarray], levels: int = 1, top_k: int = 3, min_size: int = 8, small: dict[str, np.ndarray] = None):
+        self.templates = templates
+        self.scale = 2**levels
+        self.top_k = top_k
+        self.small = {}
+        for image, template in templates.items():
+            h, w = template.shape[:2]
+            if min(h, w) // self.scale >= min_size:
+                # precompiled downscales (template bank) if we have them
+                self.small[image] = small[image] if small and image in small else cv.resize(template, (w // self.scale, h // self.scale), interpolation=cv.INTER_AREA)
+            # too small to survive the downscale, those get a full search
+
+    def candidates(self, coarse: np.ndarray) -> list[tuple[int, int]]:
+        """Top k local maxima of the coarse result."""
+        peaks = coarse >= cv.dilate(coarse, np.ones((3, 3), np.uint8))
+        ys, xs = np.nonzero(peaks)
+        best = np.argsort(coarse[ys, xs])[::-1][: self.top_k]
+        return [(int(xs[i]), int(ys[i])) for i in best]
+
+    def match(self, roi: np.ndarray, order: list[str] = None, stop_at: float = None) -> dict[str, tuple[float, tuple[int, int], float]]:
+        """Same results and early exit as TemplateSet.match."""
+        start = time.time()
+        H, W = roi.shape[:2]
+        small_roi = cv.resize(roi, (W // self.scale, H // self.scale), interpolation=cv.INTER_AREA)
+        shared = time.time() - start
+        results = {}
+        for image in order or self.templates:
+            template = self.templates[image]
+            template_start = time.time()
+            h, w = template.shape[:2]
+            if h > H or w > W:
+                results[image] = (0.0, (0, 0), 0.0)
+                continue
+            small = self.small.get(image)
+            if small is None or small.shape[0] > small_roi.shape[0] or small.shape[1] > small_roi.shape[1]:
+                _, max_conf, _, max_loc = cv.minMaxLoc(cv.matchTemplate(roi, template, cv.TM_CCOEFF_NORMED))
+                results[image] = (max_conf, max_loc, time.time() - template_start)
+                if stop_at is not None and max_conf >= stop_at:
+                    break
+                continue
+            coarse = cv.matchTemplate(small_roi, small, cv.TM_CCOEFF_NORMED)
+            pad = self.scale + 2  # a coarse pixel covers `scale` full resolution pixels, plus rounding
+            best = (-1.0, (0, 0))
+            for cx, cy in self.candidates(coarse):
+                x0, y0 = max(0, cx * self.scale - pad), max(0, cy * self.scale - pad)
+                x1, y1 = min(W, cx * self.scale + w + pad), min(H, cy * self.scale + h + pad)
+                _, max_conf, _, (x, y) = cv.minMaxLoc(cv.matchTemplate(roi[y0:y1, x0:x1], template, cv.TM_CCOEFF_NORMED))
+                if max_conf > best[0]:
+                    best = (max_conf, (x0 + x, y0 + y))
+            results[image] = (best[0], best[1], time.time() - template_start)
+            if stop_at is not None and best[0] >= stop_at:
+                break
+        per_template = shared / max(len(results), 1)
+        return {image: (conf, loc, seconds + per_template) for image, (conf, loc, seconds) in results.items()}
+
+
+def match_each(templates: dict[str, np.ndarray], roi: np.ndarray) -> dict[str, tuple[float, tuple[int, int], float]]:
+    """The plain loop, one cv.matchTemplate per template."""
+    results = {}
+    for image, template in templates.items():
+        start = time.time()
+        _, max_conf, _, max_loc = cv.minMaxLoc(cv.matchTemplate(roi, template, cv.TM_CCOEFF_NORMED))
+        results[image] = (max_conf, max_loc, time.time() - start)
+    return results
+
+
+if __name__ == "__main__":
+    # Benchmark the batched engine against the per-template loop on the shipped images:
+    # every template of a group is pasted into a noisy ROI of the size the timers search.
+    import os
+    from utils.match_modes import MatchMode, convert
+    from utils.screen_areas import area_events_truncated, area_items, area_events
+
+    groups = {
+        "images/bottle/normal": area_items,
+        "images/bottle/runes": area_items,
+        "images/roshan": area_events,
+        "images/tormentor": area_events_truncated,
+    }
+    rng = np.random.default_rng(0)
+    repeats = 10
+    for mode in (MatchMode.COLOR, MatchMode.GRAY):
+        print(f"\n{mode.value}")
+        print(f"{'group':<22} {'templates':>9} {'loop':>9} {'batched':>9} {'max diff':>9}")
+        for folder, (_, _, width, height) in groups.items():
+            templates = {f: convert(cv.imread(os.path.join(folder, f), cv.IMREAD_COLOR), mode) for f in sorted(os.listdir(folder))}
+            roi = rng.integers(0, 255, (height, width, 3), np.uint8)
+            roi = convert(cv.GaussianBlur(roi, (5, 5), 0), mode)
+            x = 5
+            for template in templates.values():
+                h, w = template.shape[:2]
+                if x + w <= width and h <= height:
+                    roi[height - h :, x : x + w] = template
+                    x += w + 5
+            engine = TemplateSet(templates)
+            engine.match(roi)  # DFT sizes and template spectra are prepared once per ROI size
+            match_each(templates, roi)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                loop = match_each(templates, roi)
+            loop_time = (time.perf_counter() - start) / repeats
+            start = time.perf_counter()
+            for _ in range(repeats):
+                batched = engine.match(roi)
+            batched_time = (time.perf_counter() - start) / repeats
+            diff = max(abs(loop[image][0] - batched[image][0]) for image in templates)
+            print(f"{folder[7:]:<22} {len(templates):>9} {loop_time * 1000:7.1f}ms {batched_time * 1000:7.1f}ms {diff:9.5f}")
+
+    # Pyramid search on the kill feed: every template pasted at a random spot of the full area_events ROI.
+    # The confidence of the pasted template has to match the full search within the tolerance.
+    tolerance = 0.02
+    print(f"\npyramid (area_events, tolerance {tolerance})")
+    print(f"{'group':<22} {'levels':>6} {'full':>9} {'pyramid':>9} {'max diff':>9}")
+    _, _, width, height = area_events
+    for folder in ("images/roshan", "images/tormentor"):
+        templates = {f: cv.imread(os.path.join(folder, f), cv.IMREAD_COLOR) for f in sorted(os.listdir(folder))}
+        for levels in (1, 2):
+            pyramid = TemplatePyramid(templates, levels)
+            full_time = pyramid_time = diff = 0.0
+            for image, template in templates.items():
+                for _ in range(repeats):
+                    roi = cv.GaussianBlur(rng.integers(0, 255, (height, width, 3), np.uint8), (5, 5), 0)
+                    h, w = template.shape[:2]
+                    x, y = rng.integers(0, width - w), rng.integers(0, height - h)
+                    roi[y : y + h, x : x + w] = np.clip(template + rng.normal(0, 4, template.shape), 0, 255)
+                    start = time.perf_counter()
+                    full = match_each(templates, roi)[image][0]
+                    full_time += time.perf_counter() - start
+                    start = time.perf_counter()
+                    coarse = pyramid.match(roi)[image][0]
+                    pyramid_time += time.perf_counter() - start
+                    diff = max(diff, abs(full - coarse))
+            runs = repeats * len(templates)
+            verdict = "ok" if diff <= tolerance else "FAIL"
+            print(f"{folder[7:]:<22} {levels:>6} {full_time / runs * 1000:7.1f}ms {pyramid_time / runs * 1000:7.1f}ms {diff:9.5f} {verdict}")
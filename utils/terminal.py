@@ -1,9 +1,12 @@
 from __future__ import annotations
+from collections import deque
 import curses
-import datetime
+from functools import lru_cache
+import threading
+import time
 
-import numpy as np # needed for lazy f-string evaluation
-from utils.settings import settings  # needed for lazy f-string evaluation
+import numpy as np
+from utils.settings import settings
 
 
 BORDER_WIDTH = 1
@@ -11,6 +14,99 @@ X_OFFSET = 4
 Y_OFFSET = 2
 
 
+ROW_CACHE = 4096  # progress bar rows kept, a few glyph sets per timer times the messages of the last minutes
+
+
+class Header:
+    """
+    A header line that changes: render(*values) gets the current values of deps and only runs again
+    when one of them changed, otherwise the last line is reused. Plain strings work as headers too."""
+
+    def __init__(self, render, *deps):
+        self.render = render
+        self.deps = deps
+        self.values = None
+        self.text = ""
+
+    def __call__(self) -> str:
+        values = tuple(dep() for dep in self.deps)
+        if values != self.values:
+            self.values = values
+            self.text = self.render(*values)
+        return self.text
+
+
+@lru_cache(maxsize=ROW_CACHE)
+def progress_row(size: int, filled: int, message: str, percent: str, lsep: str, rsep: str, fill: str) -> str:
+    """One progress bar row, `filled` of `size` cells (the progress quantized to what can be shown)."""
+    row = f"{lsep}{fill * filled}{' ' * (size - filled)}{rsep}"
+    if percent:
+        row += f" {percent}"
+    return row + f" {message}"
+
+
+@lru_cache(maxsize=ROW_CACHE)
+def range_progress_row(size: int, filled1: int, filled2: int, message: str, percent1: str, percent2: str, lsep: str, rsep: str, fill1: str, fill2: str) -> str:
+    row = f"{lsep}{fill1 * filled1}{fill2 * filled2}{' ' * (size - filled1 - filled2)}{rsep}"
+    if percent2:
+        # shown instead of the end of the bar
+        row = row[: -(len(rsep) + len(percent2) + 1)] + f" {percent2}{rsep}"
+    if percent1:
+        row += f" {percent1}"
+    return row + f" {message}"
+
+
+class FramePacer:
+    """
+    The main loop only redraws when something happened (a key, a resize, a detection result, the clock ticking
+    to the next second) and never more than max_fps times a second. Keeps the time from a key press to
+    the frame that shows it on screen."""
+
+    def __init__(self, max_fps: float):
+        self.interval = 1 / max_fps if max_fps > 0 else 0.0
+        self.generation = 0  # bumped by every event, a frame covers all events up to the one it started at
+        self.drawn_generation = -1
+        self.last_frame = 0.0
+        self.input_at = None  # the oldest key press not on screen yet
+        self.latency = deque(maxlen=64)
+        self.frames = 0
+        self._lock = threading.Lock()
+
+    def mark(self, input: bool = False):
+        """Something changed and should be on screen, input=True starts the latency clock."""
+        with self._lock:
+            self.generation += 1
+            if input and self.input_at is None:
+                self.input_at = time.perf_counter()
+
+    def wait(self) -> float:
+        """Seconds until a frame is allowed, 0 if one is due now and inf if nothing changed."""
+        if self.generation == self.drawn_generation:
+            return float("inf")
+        return max(0.0, self.last_frame + self.interval - time.perf_counter())
+
+    def begin(self) -> int:
+        return self.generation
+
+    def drawn(self, generation: int):
+        now = time.perf_counter()
+        with self._lock:
+            self.drawn_generation = generation
+            if self.input_at is not None:
+                self.latency.append(now - self.input_at)
+                self.input_at = None
+        self.last_frame = now
+        self.frames += 1
+
+    def summary(self) -> str:
+        line = f"UI: {self.frames} frames"
+        if self.latency:
+            line += f", input to screen {self.latency[-1] * 1000:.1f}ms (max {max(self.latency) * 1000:.1f}ms of the last {len(self.latency)})"
+        self.frames = 0
+        return line
+
+
+pacer = FramePacer(settings.max_fps)
 
 
 class TerminalWindow:
@@ -25,22 +121,30 @@ class TerminalWindow:
         self.y_offset = Y_OFFSET
         self.border_width = BORDER_WIDTH
         self.header = []
+        self.lines = {}  # back buffer of the frame being written: row -> (column, text, color pair)
+        self.shown = {}  # what the window has now, only rows that differ get written
+        self.damaged = True  # cleared/resized, everything (and the border) has to be drawn again
+        self.written = 0
+        self.skipped = 0
         # TODO: writeable area is   x[BORDER_WIDTH + X_OFFSET] to x[ncols - BORDER_WIDTH - X_OFFSET]
         #                           y[BORDER_WIDTH + Y_OFFSET] to y[nlines - BORDER_WIDTH - Y_OFFSET]
-  
-  
-    def fstr(self, template):
-        return eval(f'f"""{template}"""')
+
+
     def startWrite(self):
         if not self.disabled:
-            self.window.clear()
+            self.lines = {}
             for line in self.header:
-                self.write(self.fstr(line))
+                self.write(line() if callable(line) else line)
             
     # TODO: add header
     def resize(self, nlines, ncols):
         self.window.resize(nlines, ncols)
         self.height, self.width = nlines, ncols  # bookkeeping
+        self.damaged = True
+
+    def clear(self):
+        self.window.clear()
+        self.damaged = True
 
     def write(self, text, color_pair=0):
         if not self.disabled:
@@ -66,8 +170,7 @@ class TerminalWindow:
         Create a progress bar with a message and a percentage.
         Will write a progress bar to the full width of the window."""
         if not self.disabled:
-            percent = f"{progress:.2%}"
-            percent = percent.rjust(7)
+            percent = f"{progress:.2%}".rjust(7) if showPercentage else ""
 
             max_size = self.width - self.x_offset * 2 - self.border_width * 2
 
@@ -78,13 +181,8 @@ class TerminalWindow:
             if showPercentage:
                 current_message_size += len(percent) + 1  # +1 for the space
             progress_bar_size = max_size - current_message_size
-            progress = int(progress * progress_bar_size)
-            ret = f"{lsep}{fill * progress}{' ' * (progress_bar_size - progress)}{rsep}"
-
-            if showPercentage:
-                ret += f" {percent}"
-            ret += f" {message}"
-            self.write(ret, color_pair)
+            filled = int(progress * progress_bar_size)
+            self.write(progress_row(progress_bar_size, filled, message, percent, lsep, rsep, fill), color_pair)
             
     def writeRangeProgressBar(
         self,
@@ -104,8 +202,8 @@ class TerminalWindow:
         Create a 2-segment progress bar with a message and a percentage.
         Will write a progress bar to the full width of the window."""
         if not self.disabled:
-            percent1 = f"{progress1:.2%}".ljust(7)
-            percent2 = f"{progress2:.2%}".ljust(7)
+            percent1 = f"{progress1:.2%}".ljust(7) if showPercentage1 else ""
+            percent2 = f"{progress2:.2%}".ljust(7) if showpercentage2 else ""
             max_size = self.width - self.x_offset * 2 - self.border_width * 2
 
             current_message_size = (
@@ -121,22 +219,18 @@ class TerminalWindow:
             # Determine the size of each segment
             segment1_size = int(progress1 * (progress_bar_size / 2))
             segment2_size = int(progress2 * (progress_bar_size / 2))
-
-            # Generate the progress bar string
-            ret = f"{lsep}{fill1 * segment1_size}{fill2 * segment2_size}{' ' * (progress_bar_size - segment1_size - segment2_size)}{rsep}"
-            
-            
-            # Add percentages if required
-            
-            if showpercentage2:
-                go_back = len(rsep) + len(percent2) + 1
-                ret = ret[:-go_back]
-                ret += f" {percent2}{rsep}"
-                
-            if showPercentage1:
-                ret += f" {percent1}"
-            
-            ret += f" {message}"
+            ret = range_progress_row(
+                progress_bar_size,
+                segment1_size,
+                segment2_size,
+                message,
+                percent1,
+                percent2,
+                lsep,
+                rsep,
+                fill1,
+                fill2,
+            )
 
             # TODO: Write each segment with its respective color pair
             self.write(ret, color_pair1)
@@ -166,14 +260,43 @@ class TerminalWindow:
             self.y_offset += 1
             if self.y_offset > self.height - self.border_width:  #
                 self.y_offset = Y_OFFSET
-            self.window.addstr(self.y_offset, self.x_offset, f"{text}", curses.color_pair(color_pair))
-            
+            self.lines[self.y_offset] = (self.x_offset, text, color_pair)
+
+    def flush(self):
+        """Put the rows that changed since the last frame on the window, blank the ones that are gone."""
+        if self.damaged:
+            self.window.erase()
+            self.shown = {}
+        length = self.width - self.x_offset * 2 - self.border_width * 2
+        changed = False
+        for row in sorted(self.shown.keys() | self.lines.keys()):
+            line = self.lines.get(row)
+            if line == self.shown.get(row):
+                self.skipped += 1
+                continue
+            x, text, color_pair = line or (self.shown[row][0], "", 0)
+            # pad to the full line, that overwrites whatever was longer before
+            self.window.addstr(row, x, text.ljust(max(length, 0))[:max(self.width - x - self.border_width, 0)], curses.color_pair(color_pair))
+            self.written += 1
+            changed = True
+        if changed or self.damaged:
+            self.window.border()
+        self.shown = self.lines
+        self.damaged = False
+
     def finishWrite(self, reset: bool = True):
+        """Flush the frame to the window, curses.doupdate() in the main loop puts all windows on screen at once."""
         if not self.disabled:
             if reset:
                 self.y_offset = Y_OFFSET
-            self.window.border()
-            self.window.refresh()
+            self.flush()
+            self.window.noutrefresh()
+
+    def summary(self) -> str:
+        total = self.written + self.skipped
+        line = f"Rendering: {self.written} of {total} lines written ({self.skipped} unchanged)"
+        self.written = self.skipped = 0
+        return line
 
 
 class WindowGrid:
@@ -327,3 +450,56 @@ class SelfGrowingWindowGrid(WindowGrid):
         
         for window in [window for window in self.windows if not window.disabled]:
             self._resizeWindow(window)
+
+
+if __name__ == "__main__":
+    # Render cost per frame, old clear-and-redraw against the back buffer: python -m utils.terminal (in a real terminal)
+    import time
+
+    FRAMES = 300
+    results = {}
+
+    def frame_lines(i: int, width: int) -> list[str]:
+        # a confidence window: mostly the same lines every frame, a couple of numbers change
+        lines = [f"Screenshot taken in 0.0{i % 7}s (mss, 93600 px)", "Game Time (predicted): 0:12:34", f"Total: 0.0{i % 5}s"]
+        lines += [f"images\\roshan\\roshan.png: 0.{(j * 37) % 100:02d}" for j in range(20)]
+        return [line[:width] for line in lines]
+
+    def bench(stdscr):
+        lines, cols = stdscr.getmaxyx()
+        window = TerminalWindow(lines, cols, 0, 0)
+        width = window.width - window.x_offset * 2 - window.border_width * 2
+        start = time.perf_counter()
+        for i in range(FRAMES):
+            window.window.clear()
+            for row, line in enumerate(frame_lines(i, width)):
+                window.window.addstr(Y_OFFSET + 1 + row, X_OFFSET, line)
+            window.window.border()
+            window.window.refresh()
+        results["clear and redraw"] = (time.perf_counter() - start) / FRAMES
+        window.clear()
+        start = time.perf_counter()
+        for i in range(FRAMES):
+            window.startWrite()
+            for line in frame_lines(i, width):
+                window.write(line)
+            window.finishWrite()
+            curses.doupdate()
+        results["back buffer"] = (time.perf_counter() - start) / FRAMES
+        results["lines"] = window.summary()
+        # three big progress bars ticking once a second, with the row cache and with it emptied every frame
+        for name, clear in (("progress bars, cached rows", False), ("progress bars, rows built every frame", True)):
+            start = time.perf_counter()
+            for i in range(FRAMES):
+                if clear:
+                    progress_row.cache_clear()
+                window.startWrite()
+                for bar in range(3):
+                    window.bigProgressBar(((i // 10) % 100) / 100, f"{300 - i // 10}s Timer {bar}")
+                window.finishWrite()
+                curses.doupdate()
+            results[name] = (time.perf_counter() - start) / FRAMES
+
+    curses.wrapper(bench)
+    for name, value in results.items():
+        print(f"{name}: {value * 1000:.3f}ms per frame" if isinstance(value, float) else value)
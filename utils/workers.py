@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
+from utils.settings import settings
+
+
+class MatchPool:
+    """
+    Thread pool for the heavy lifting (template matching, OCR). OpenCV releases the GIL,
+    so awaiting work here actually runs timers and templates on several cores at once.
+    Keeps per worker timing, shown in the confidence window."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="match") if size > 0 else None
+        self.busy = defaultdict(float)
+        self.jobs = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _timed(self, fn, args):
+        start = time.time()
+        try:
+            return fn(*args)
+        finally:
+            name = threading.current_thread().name
+            with self._lock:
+                self.busy[name] += time.time() - start
+                self.jobs[name] += 1
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on a worker, or inline without a pool."""
+        if self.executor is None:
+            return self._timed(fn, args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._timed, fn, args)
+
+    def background(self, fn, *args) -> Future:
+        """Start fn(*args) on a worker (or its own thread without a pool) without waiting for it."""
+        if self.executor is not None:
+            return self.executor.submit(self._timed, fn, args)
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self._timed(fn, args))
+            except Exception as error:
+                future.set_exception(error)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def summary(self, reset: bool = True) -> list[str]:
+        """One line per worker with the work it did since the last summary."""
+        with self._lock:
+            lines = [f"{name}: {self.jobs[name]} jobs, {self.busy[name]:.3f}s busy" for name in sorted(self.jobs)]
+            if reset:
+                self.busy.clear()
+                self.jobs.clear()
+        return lines
+
+
+match_pool = MatchPool(settings.workers)